@@ -0,0 +1,243 @@
+"""Local stand-in for the parts of ODK Central the sync uses.
+
+Serves sessions, the problems entity list, the report_problem and
+address_problem submission feeds (OData $top/$skip/$filter with
+@odata.nextLink) and their photo attachments with ETags, all generated
+deterministically from a seed.
+"""
+import io
+import json
+import random
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow attachments are random bytes and no variants get made
+    Image = None
+
+SEVERITIES = ('High', 'Medium', 'Low')
+STATUSES = ('open', 'waiting', 'fixed')
+TIMEFRAMES = ('short', 'long')
+TYPES = ('Road', 'Water', 'Electricity', 'Waste', 'Health')
+WORDS = ('pothole', 'leak', 'broken', 'streetlight', 'flooding', 'blocked', 'drain', 'bridge',
+         'school', 'clinic', 'pipe', 'market', 'collapsed', 'overflowing', 'outage', 'road')
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f'{moment.microsecond // 1000:03d}Z'
+
+def make_photo(seed, size):
+    """Return a JPEG of roughly phone-camera proportions, or random bytes without Pillow."""
+    rng = random.Random(seed)
+    if Image is None:
+        return rng.randbytes(size[0] * size[1] // 10)
+    image = Image.new('RGB', size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    # Some noise so the JPEG isn't trivially small
+    noise = Image.effect_noise(size, 40).convert('RGB')
+    image = Image.blend(image, noise, 0.3)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+class MockODKData:
+    """Synthetic issues, photos and responses."""
+
+    def __init__(self, issues=1000, responses=2000, photos=True, photo_size=(1600, 1200), seed=42):
+        self.rng = random.Random(seed)
+        self.clock = EPOCH
+        self.lock = threading.Lock()
+        self.entities = []
+        self.reports = []
+        self.responses = []
+        # A handful of distinct photos is enough; each attachment name maps to one
+        self.photos = [make_photo(seed + i, photo_size) for i in range(8)] if photos else []
+        for i in range(issues):
+            self._add_issue(i)
+        for i in range(responses):
+            self.add_response(f'uuid:issue-{self.rng.randrange(issues)}' if issues else None)
+
+    def _tick(self):
+        self.clock += timedelta(seconds=self.rng.randint(1, 600))
+        return _timestamp(self.clock)
+
+    def _add_issue(self, i):
+        issue_id = f'uuid:issue-{i}'
+        label = f'Issue {i}'
+        created = self._tick()
+        self.entities.append({
+            '__id': issue_id,
+            'label': label,
+            'type': self.rng.choice(TYPES),
+            'description': ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(6, 30))),
+            'severity': self.rng.choice(SEVERITIES),
+            'status': self.rng.choice(STATUSES),
+            'timeframe': self.rng.choice(TIMEFRAMES),
+            'costusd': str(self.rng.randint(0, 5000)),
+            'savedusd': str(self.rng.randint(0, 2000)),
+            'geometry': f'{self.rng.uniform(-4.5, 4.5):.6f} {self.rng.uniform(29.5, 35.0):.6f} 0 0',
+            '__system': {'createdAt': created, 'updatedAt': None, 'version': 1,
+                         'creatorId': '1', 'creatorName': 'Benchmark'},
+        })
+        self.reports.append({
+            '__id': f'uuid:report-{i}',
+            'problem': {
+                'problem_title': label,
+                'problem_label': label,
+                'problem_image': f'photo-{i}.jpg' if self.photos else None,
+            },
+            '__system': {'submissionDate': created, 'updatedAt': None},
+        })
+
+    def add_response(self, issue_id):
+        with self.lock:
+            i = len(self.responses)
+            self.responses.append({
+                '__id': f'uuid:response-{i}',
+                'entity': {'problem': issue_id},
+                'action': {
+                    'role': self.rng.choice(('citizen', 'official')),
+                    'status': self.rng.choice(STATUSES),
+                    'action_taken': ' '.join(self.rng.choice(WORDS) for _ in range(8)),
+                    'resolution_costusd': str(self.rng.randint(0, 500)),
+                    'resolution_timeframe': self.rng.choice(TIMEFRAMES),
+                    'recommended_contact': 'Ward office',
+                    'image': f'action-{i}.jpg' if self.photos and i % 3 == 0 else None,
+                },
+                '__system': {'submissionDate': self._tick(), 'updatedAt': None, 'submitterName': 'Benchmark'},
+            })
+
+    def update_issues(self, count):
+        """Edit `count` random issues so the next incremental sync picks them up."""
+        with self.lock:
+            for entity in self.rng.sample(self.entities, min(count, len(self.entities))):
+                entity['status'] = self.rng.choice(STATUSES)
+                entity['__system']['version'] += 1
+                entity['__system']['updatedAt'] = self._tick()
+
+    def feed(self, path):
+        if path.endswith('/problems.svc/Entities'):
+            return self.entities
+        if path.endswith('/report_problem.svc/Submissions'):
+            return self.reports
+        if path.endswith('/address_problem.svc/Submissions'):
+            return self.responses
+        return None
+
+    def photo(self, name):
+        if not self.photos:
+            return None
+        number = int(re.sub(r'\D', '', name) or 0)
+        return self.photos[number % len(self.photos)]
+
+def _matches(record, odata_filter):
+    # Supports the "__system/<field> ge <timestamp>" clauses joined by "or" that the sync sends
+    if not odata_filter:
+        return True
+    for field, operator, value in re.findall(r'__system/(\w+) (ge|gt) (\S+)', odata_filter):
+        current = record['__system'].get(field)
+        if current and (current >= value if operator == 'ge' else current > value):
+            return True
+    return False
+
+def _handler(data, token):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b'', content_type='application/json', headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def _send_json(self, status, payload):
+            self._send(status, json.dumps(payload).encode('utf-8'))
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if urlparse(self.path).path.rstrip('/') != '/v1/sessions':
+                return self._send_json(404, {'message': 'Not found'})
+            expires = datetime.now(timezone.utc) + timedelta(hours=24)
+            self._send_json(200, {'token': token, 'expiresAt': _timestamp(expires)})
+
+        def do_GET(self):
+            if self.headers.get('Authorization') != f'Bearer {token}':
+                return self._send_json(401, {'message': 'Unauthorized'})
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+
+            if '/attachments/' in url.path:
+                name = url.path.rsplit('/', 1)[1]
+                photo = data.photo(name)
+                if photo is None:
+                    return self._send_json(404, {'message': 'Not found'})
+                etag = f'"{name}-1"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, headers={'ETag': etag})
+                return self._send(200, photo, content_type='image/jpeg', headers={'ETag': etag})
+
+            records = data.feed(url.path)
+            if records is None:
+                return self._send_json(404, {'message': 'Not found'})
+            odata_filter = query.get('$filter', [None])[0]
+            with data.lock:
+                records = [record for record in records if _matches(record, odata_filter)]
+            skip = int(query.get('$skip', ['0'])[0])
+            top = int(query['$top'][0]) if '$top' in query else None
+            page = records[skip:skip + top] if top else records[skip:]
+            body = {'value': page}
+            if top and skip + top < len(records):
+                next_query = f'$top={top}&$skip={skip + top}'
+                if odata_filter:
+                    next_query += f'&$filter={quote(odata_filter)}'
+                body['@odata.nextLink'] = f'http://{self.headers["Host"]}{url.path}?{next_query}'
+            self._send_json(200, body)
+
+        do_HEAD = do_GET
+
+    return Handler
+
+class MockODKServer:
+    """Runs the mock on a background thread; use as a context manager."""
+
+    def __init__(self, data, host='127.0.0.1', port=0, token='benchmark-token'):
+        self.data = data
+        self.server = ThreadingHTTPServer((host, port), _handler(data, token))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='mock-odk', daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve a mock ODK Central with synthetic data.')
+    parser.add_argument('--issues', type=int, default=1000)
+    parser.add_argument('--responses', type=int, default=2000)
+    parser.add_argument('--no-photos', action='store_true')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    with MockODKServer(MockODKData(args.issues, args.responses, photos=not args.no_photos), port=args.port) as server:
+        print(f'Mock ODK Central at {server.url} (set ODK_BASE_URL to this)')
+        server.thread.join()
@@ -0,0 +1,218 @@
+"""Sync and API benchmarks against the local mock ODK Central.
+
+    python -m benchmarks.run --issues 5000 --responses 10000 --output results.json
+
+Runs a full sync, a no-op incremental sync and an incremental sync after
+edits into a throwaway database, then times the JSON APIs with cold and warm
+response caches. Results are written as JSON so runs can be compared.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.mock_odk import MockODKData, MockODKServer
+
+# (name, path) pairs timed against the synced database
+API_SCENARIOS = [
+    ('issues_all', '/api/issues'),
+    ('issues_page', '/api/issues?limit=50'),
+    ('issues_board_column', '/api/issues?column=fixed&limit=30&fields=label,severity,timeframe'),
+    ('issues_search', '/api/issues?search=pothole'),
+    ('issues_filtered', '/api/issues?state=open&severity=high&timeframe=short'),
+    ('issues_date_range', '/api/issues?start_date=2024-01-01&end_date=2024-02-01'),
+    ('stats', '/api/stats'),
+    ('stats_filtered', '/api/stats?severity=high'),
+    ('map_clusters', '/api/issues/geo?zoom=5'),
+    ('map_tile', '/tiles/issues/6/37/31'),
+]
+
+def _max_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def _size_mb(path):
+    # A file, or every file under a directory
+    if os.path.isfile(path):
+        return os.path.getsize(path) / (1024 * 1024)
+    total = 0
+    for directory, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+    return total / (1024 * 1024)
+
+def _database_mb(database):
+    # Fold the WAL back into the main file so its size reflects the data
+    conn = database.get_db_connection()
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return sum(_size_mb(database.DB_PATH + suffix) for suffix in ('', '-wal') if os.path.exists(database.DB_PATH + suffix))
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _summarize(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+def run_sync(odk_api, database, incremental, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    api = odk_api.get_odk_client()
+    result = api.update_existing_issues_and_responses(incremental=incremental)
+    elapsed = time.perf_counter() - started
+    stage = {
+        'seconds': round(elapsed, 3),
+        'issues_written': len(result.get('issues', [])),
+        'images_written': len(result.get('images', [])),
+        'responses_written': len(result.get('responses', [])),
+        # ru_maxrss can't be reset, so this is the peak of the whole run so far, not of this stage
+        'process_peak_rss_mb': round(_max_rss_mb(), 1),
+        'database_mb': round(_database_mb(database), 2),
+        'blob_store_mb': round(_size_mb(database.BLOB_STORE_PATH), 2) if os.path.isdir(database.BLOB_STORE_PATH) else 0.0,
+    }
+    if trace_memory:
+        stage['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    return stage
+
+def run_api(main, repeat):
+    client = main.app.test_client()
+    results = {}
+    for name, path in API_SCENARIOS:
+        cold, warm = [], []
+        for _ in range(repeat):
+            # A new generation empties the cache, as a sync would
+            main.invalidate_caches()
+            started = time.perf_counter()
+            response = client.get(path)
+            cold.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            started = time.perf_counter()
+            client.get(path)
+            warm.append(time.perf_counter() - started)
+
+        body = client.get(path).get_data()
+        gzipped = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        etag = gzipped.headers.get('ETag')
+        started = time.perf_counter()
+        revalidated = client.get(path, headers={'If-None-Match': etag}) if etag else None
+        revalidate_seconds = time.perf_counter() - started
+
+        results[name] = {
+            'path': path,
+            'cold': _summarize(cold),
+            'warm': _summarize(warm),
+            'revalidate_ms': round(revalidate_seconds * 1000, 3) if revalidated is not None else None,
+            'revalidate_status': revalidated.status_code if revalidated is not None else None,
+            'bytes': len(body),
+            'bytes_gzip': len(gzipped.get_data()) if gzipped.content_encoding == 'gzip' else len(gzip.compress(body)),
+        }
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--issues', type=int, default=1000)
+    parser.add_argument('--responses', type=int, default=2000)
+    parser.add_argument('--no-photos', action='store_true', help='generate submissions without attachments')
+    parser.add_argument('--updates', type=int, default=100, help='issues edited before the incremental sync')
+    parser.add_argument('--repeat', type=int, default=20, help='requests per API scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='record Python peak memory per sync with tracemalloc (slows the sync)')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark database and image files')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='odk-benchmark-')
+    try:
+        results = run_benchmarks(args, workdir)
+    finally:
+        if args.keep:
+            print(f"Kept benchmark data in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+    for name, stage in results['sync'].items():
+        print(f"  sync {name}: {stage['seconds']}s ({stage['issues_written']} issues written)")
+    for name, timing in results['api'].items():
+        print(f"  {name}: cold p50 {timing['cold']['p50_ms']}ms, warm p50 {timing['warm']['p50_ms']}ms, "
+              f"{timing['bytes']} bytes")
+
+def run_benchmarks(args, workdir):
+    data = MockODKData(args.issues, args.responses, photos=not args.no_photos, seed=args.seed)
+    with MockODKServer(data) as server:
+        # Settings are read at import time, so set them before loading the app
+        os.environ.update({
+            'ODK_BASE_URL': server.url,
+            'API_EMAIL': 'benchmark@example.com',
+            'API_PASSWORD': 'benchmark',
+            'DATABASE_PATH': os.path.join(workdir, 'benchmark.db'),
+            'BLOB_STORE_PATH': os.path.join(workdir, 'blobs'),
+        })
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        import database
+        from utils import odk_api
+        import main as app_main
+        # Syncs are run directly below; keep the app from starting its own worker and scheduler
+        app_main.app.testing = True
+
+        database.init_db()
+        sync = {'full': run_sync(odk_api, database, incremental=False, trace_memory=args.trace_memory)}
+        sync['incremental_noop'] = run_sync(odk_api, database, incremental=True, trace_memory=args.trace_memory)
+        data.update_issues(args.updates)
+        for _ in range(args.updates):
+            data.add_response(data.rng.choice(data.entities)['__id'])
+        sync['incremental_changes'] = run_sync(odk_api, database, incremental=True, trace_memory=args.trace_memory)
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'git_commit': _git_commit(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+            },
+            'config': {
+                'issues': args.issues,
+                'responses': args.responses,
+                'photos': not args.no_photos,
+                'updates': args.updates,
+                'repeat': args.repeat,
+                'seed': args.seed,
+            },
+            'sync': sync,
+            'api': run_api(app_main, args.repeat),
+        }
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,85 @@
+import os
+import json
+import base64
+import queue
 import sqlite3
 import logging
-import base64
 from datetime import datetime
+from utils.metrics import DB_QUERY_SECONDS
+from utils.blobstore import BlobStore
 
-def get_db_connection():
-    conn = sqlite3.connect('issues.db')
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv('DATABASE_PATH', 'issues.db')
+DB_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '8'))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', '5000'))
+DB_MMAP_SIZE = int(os.getenv('DATABASE_MMAP_SIZE', str(256 * 1024 * 1024)))
+# Image files, named by content hash; rows only store the hash. Absolute, since
+# Flask's send_file resolves relative paths against the app root, not the CWD
+BLOB_STORE_PATH = os.path.abspath(os.getenv('BLOB_STORE_PATH', os.path.join(os.path.dirname(DB_PATH), 'blobs')))
+
+blob_store = BlobStore(BLOB_STORE_PATH)
+# Unreferenced image files younger than this are kept: a sync writes files
+# before committing the rows that refer to them
+BLOB_PRUNE_GRACE_SECONDS = int(os.getenv('BLOB_PRUNE_GRACE_SECONDS', '3600'))
+# Finished sync jobs are deleted once they are this old
+SYNC_JOB_RETENTION_DAYS = int(os.getenv('SYNC_JOB_RETENTION_DAYS', '7'))
+
+_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+
+def _timed(function):
+    # Records each call under db_query_seconds{operation=<function name>}
+    return DB_QUERY_SECONDS.timed(operation=function.__name__.lstrip('_'))(function)
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # WAL lets dashboard readers run while the sync is writing
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
     return conn
 
+class PooledConnection:
+    """A pooled sqlite3 connection; close() returns it to the pool instead of closing it.
+
+    Each checkout is used by one thread at a time, so connections can safely be
+    shared between request threads.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+def get_db_connection():
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _connect()
+    return PooledConnection(conn)
+
 def init_db():
     conn = get_db_connection()
     cur = conn.cursor()
@@ -63,153 +135,814 @@ def init_db():
     )
     ''')
 
+    # Create image variants table (downscaled copies of issue and response images)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS image_variants (
+        owner_type TEXT,
+        owner_id TEXT,
+        variant TEXT,
+        image BLOB,
+        PRIMARY KEY (owner_type, owner_id, variant)
+    )
+    ''')
+
+    # Create attachments table (which ODK attachment, and which version of it, is stored)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS attachments (
+        owner_type TEXT,
+        owner_id TEXT,
+        name TEXT,
+        etag TEXT,
+        PRIMARY KEY (owner_type, owner_id)
+    )
+    ''')
+
+    # Create sync state table (per-feed cursor for incremental ODK sync)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        feed TEXT PRIMARY KEY,
+        cursor TEXT,
+        synced_at TEXT
+    )
+    ''')
+
+    # Indexes backing the per-issue response aggregate used by the issue listing
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_responses_entity_problem ON responses (entity_problem, SubmissionDate)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_images_title ON images (title)')
+    # Matches images to issues by label (see _link_images_to_issues) without a scan per image
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_issues_label ON issues (label, created_at)')
+
+    applied = _migrate(cur)
+
     conn.commit()
+    if _move_images_to_blob_store in applied:
+        # Give back the space the inline images used
+        logger.info("Compacting database after moving images out.")
+        cur.execute('VACUUM')
     conn.close()
 
-def insert_or_update_issue(issue_data):
+def _add_filter_columns(cur):
+    # Lowercased copies of the filter columns, kept in sync by SQLite itself
+    for column in ('status', 'severity', 'timeframe'):
+        cur.execute(f'ALTER TABLE issues ADD COLUMN {column}_norm TEXT GENERATED ALWAYS AS (LOWER(TRIM({column}))) VIRTUAL')
+        cur.execute(f'CREATE INDEX IF NOT EXISTS idx_issues_{column}_norm ON issues ({column}_norm)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_issues_created_at ON issues (created_at)')
+
+    # Images were matched to issues by title on every read; store the link instead
+    cur.execute('ALTER TABLE images ADD COLUMN issue_id TEXT REFERENCES issues (id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_images_issue_id ON images (issue_id)')
+    _link_images_to_issues(cur)
+
+def _add_search_index(cur):
+    # Full-text index over issue text plus the action_taken text of its responses.
+    # Rows share the issue's rowid and are maintained by triggers.
+    cur.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5(
+        label, description, type, responses,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''')
+    responses_text = "(SELECT group_concat(action_action_taken, ' ') FROM responses WHERE entity_problem = {issue_id})"
+    cur.executescript(f'''
+    CREATE TRIGGER IF NOT EXISTS issues_fts_insert AFTER INSERT ON issues BEGIN
+        INSERT INTO issues_fts (rowid, label, description, type, responses)
+        VALUES (new.rowid, new.label, new.description, new.type, {responses_text.format(issue_id='new.id')});
+    END;
+    CREATE TRIGGER IF NOT EXISTS issues_fts_update AFTER UPDATE OF label, description, type ON issues BEGIN
+        UPDATE issues_fts SET label = new.label, description = new.description, type = new.type
+        WHERE rowid = new.rowid;
+    END;
+    CREATE TRIGGER IF NOT EXISTS issues_fts_delete AFTER DELETE ON issues BEGIN
+        DELETE FROM issues_fts WHERE rowid = old.rowid;
+    END;
+    CREATE TRIGGER IF NOT EXISTS responses_fts_insert AFTER INSERT ON responses BEGIN
+        UPDATE issues_fts SET responses = {responses_text.format(issue_id='new.entity_problem')}
+        WHERE rowid = (SELECT rowid FROM issues WHERE id = new.entity_problem);
+    END;
+    CREATE TRIGGER IF NOT EXISTS responses_fts_update AFTER UPDATE OF action_action_taken, entity_problem ON responses BEGIN
+        UPDATE issues_fts SET responses = {responses_text.format(issue_id='old.entity_problem')}
+        WHERE rowid = (SELECT rowid FROM issues WHERE id = old.entity_problem);
+        UPDATE issues_fts SET responses = {responses_text.format(issue_id='new.entity_problem')}
+        WHERE rowid = (SELECT rowid FROM issues WHERE id = new.entity_problem);
+    END;
+    CREATE TRIGGER IF NOT EXISTS responses_fts_delete AFTER DELETE ON responses BEGIN
+        UPDATE issues_fts SET responses = {responses_text.format(issue_id='old.entity_problem')}
+        WHERE rowid = (SELECT rowid FROM issues WHERE id = old.entity_problem);
+    END;
+    ''')
+    cur.execute(f'''
+        INSERT INTO issues_fts (rowid, label, description, type, responses)
+        SELECT rowid, label, description, type, {responses_text.format(issue_id='issues.id')}
+        FROM issues
+    ''')
+
+def _add_location_index(cur):
+    # R*-tree over issue coordinates keyed by the issue's rowid, maintained by triggers
+    cur.execute('CREATE VIRTUAL TABLE IF NOT EXISTS issues_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)')
+    cur.executescript('''
+    CREATE TRIGGER IF NOT EXISTS issues_geo_insert AFTER INSERT ON issues
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO issues_geo (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+    END;
+    CREATE TRIGGER IF NOT EXISTS issues_geo_update AFTER UPDATE OF latitude, longitude ON issues BEGIN
+        DELETE FROM issues_geo WHERE id = old.rowid;
+        INSERT INTO issues_geo (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END;
+    CREATE TRIGGER IF NOT EXISTS issues_geo_delete AFTER DELETE ON issues BEGIN
+        DELETE FROM issues_geo WHERE id = old.rowid;
+    END;
+    ''')
+    cur.execute('''
+        INSERT INTO issues_geo (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT rowid, latitude, latitude, longitude, longitude
+        FROM issues
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''')
+
+def _add_issue_stats(cur):
+    # issue_facts holds each issue's contribution to the dashboard statistics and
+    # issue_stats the running totals per dimension value, so summaries never
+    # scan the issues table
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS issue_facts (
+        issue_id TEXT PRIMARY KEY,
+        status TEXT,
+        severity TEXT,
+        type TEXT,
+        timeframe TEXT,
+        cost REAL,
+        saved REAL,
+        resolution_hours REAL
+    )
+    ''')
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS issue_stats (
+        dimension TEXT,
+        value TEXT,
+        issue_count INTEGER NOT NULL DEFAULT 0,
+        total_cost REAL NOT NULL DEFAULT 0,
+        total_saved REAL NOT NULL DEFAULT 0,
+        resolved_count INTEGER NOT NULL DEFAULT 0,
+        total_resolution_hours REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, value)
+    )
+    ''')
+    cur.execute('SELECT id FROM issues')
+    issue_ids = [row[0] for row in cur.fetchall()]
+    for chunk in _chunks(issue_ids):
+        _refresh_issue_facts(cur, chunk)
+
+def _add_sync_jobs(cur):
+    # Queue of syncs for the worker process; the partial unique index allows at
+    # most one queued or running job, which is how overlapping triggers are merged
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS sync_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trigger TEXT,
+        full_refresh INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        result TEXT,
+        error TEXT
+    )
+    ''')
+    cur.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_active ON sync_jobs ((status IN ('queued', 'running')))
+        WHERE status IN ('queued', 'running')
+    ''')
+
+def _add_metrics_snapshots(cur):
+    # Latest metrics published by processes other than the web server (the sync worker)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS metrics_snapshots (
+        source TEXT PRIMARY KEY,
+        snapshot TEXT,
+        updated_at TEXT
+    )
+    ''')
+
+def _move_images_to_blob_store(cur):
+    # Image bytes move to content-addressed files and rows keep only the hash.
+    # The old BLOB columns are left in place (always NULL from here on) rather
+    # than dropped, which older SQLite versions can't do.
+    cur.execute('ALTER TABLE images ADD COLUMN image_hash TEXT')
+    cur.execute('ALTER TABLE responses ADD COLUMN action_image_hash TEXT')
+    cur.execute('ALTER TABLE image_variants ADD COLUMN image_hash TEXT')
+    for table, column in (('images', 'image'), ('responses', 'action_image'), ('image_variants', 'image')):
+        cur.execute(f'SELECT rowid FROM {table} WHERE {column} IS NOT NULL')
+        # One image in memory at a time
+        for rowid in [row[0] for row in cur.fetchall()]:
+            cur.execute(f'SELECT {column} FROM {table} WHERE rowid = ?', (rowid,))
+            digest = blob_store.put(cur.fetchone()[0])
+            cur.execute(f'UPDATE {table} SET {column}_hash = ?, {column} = NULL WHERE rowid = ?', (digest, rowid))
+
+# Schema changes applied to existing databases, in order; PRAGMA user_version
+# records how many have been applied.
+SCHEMA_MIGRATIONS = [
+    _add_filter_columns,
+    _add_search_index,
+    _add_location_index,
+    _add_issue_stats,
+    _add_sync_jobs,
+    _add_metrics_snapshots,
+    _move_images_to_blob_store,
+]
+
+def _migrate(cur):
+    cur.execute('PRAGMA user_version')
+    version = cur.fetchone()[0]
+    applied = []
+    for number, migration in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        logger.info(f"Applying schema migration {number}: {migration.__name__}")
+        migration(cur)
+        cur.execute(f'PRAGMA user_version = {number}')
+        applied.append(migration)
+    return applied
+
+def _link_images_to_issues(cur):
+    cur.execute('''
+        UPDATE images
+        SET issue_id = (
+            SELECT issues.id FROM issues
+            WHERE issues.label = images.title
+            ORDER BY issues.created_at
+            LIMIT 1
+        )
+        WHERE issue_id IS NULL
+    ''')
+
+ISSUE_COLUMNS = (
+    'id', 'label', 'type', 'description', 'severity', 'status', 'timeframe', 'action_taken',
+    'costusd', 'savedusd', 'recommended_contact', 'updated_at', 'version', 'latitude', 'longitude',
+    'created_at', 'creator_id', 'creator_name'
+)
+
+RESPONSE_COLUMNS = (
+    'SubmissionDate', 'entity_problem', 'action_role', 'action_status', 'action_action_taken',
+    'action_image_hash', 'action_resolution_costusd', 'action_resolution_timeframe',
+    'action_recommended_contact', 'KEY', 'SubmitterName'
+)
+
+def _chunks(items, size=500):
+    # Keeps IN (...) lists under SQLite's bound parameter limit
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+@_timed
+def upsert_issues(issues):
+    """Insert new issues and update changed ones in a single transaction.
+
+    Rows are only rewritten when their ODK version or updated_at differs from
+    what is stored. Returns the ids of the issues that were written.
+    """
+    if not issues:
+        return []
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute('''
-        INSERT OR REPLACE INTO issues (
-            id, label, type, description, severity, status, timeframe, action_taken,
-            costusd, savedusd, recommended_contact, updated_at, version, latitude, longitude,
-            created_at, creator_id, creator_name
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            issue_data['id'], issue_data['label'], issue_data['type'], issue_data['description'],
-            issue_data['severity'], issue_data['status'], issue_data['timeframe'], issue_data['action_taken'],
-            issue_data['costusd'], issue_data['savedusd'], issue_data['recommended_contact'],
-            issue_data['updated_at'], issue_data['version'], issue_data['latitude'], issue_data['longitude'],
-            issue_data['created_at'], issue_data['creator_id'], issue_data['creator_name']
-        ))
+        stored = {}
+        for chunk in _chunks([issue['id'] for issue in issues]):
+            cur.execute(f"SELECT id, version, updated_at FROM issues WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            stored.update({row['id']: (row['version'], row['updated_at']) for row in cur.fetchall()})
+        changed = [issue for issue in issues if stored.get(issue['id']) != (issue['version'], issue['updated_at'])]
+
+        assignments = ', '.join(f"{column} = excluded.{column}" for column in ISSUE_COLUMNS if column != 'id')
+        cur.executemany(f'''
+        INSERT INTO issues ({', '.join(ISSUE_COLUMNS)})
+        VALUES ({', '.join('?' * len(ISSUE_COLUMNS))})
+        ON CONFLICT(id) DO UPDATE SET {assignments}
+        WHERE issues.version IS NOT excluded.version OR issues.updated_at IS NOT excluded.updated_at
+        ''', [tuple(issue[column] for column in ISSUE_COLUMNS) for issue in changed])
+        _link_images_to_issues(cur)
         conn.commit()
-        logging.info(f"Issue {issue_data['id']} inserted/updated successfully.")
+        logger.info(f"Upserted {len(changed)} of {len(issues)} issues.")
+        return [issue['id'] for issue in changed]
     except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
+        conn.rollback()
+        logger.error(f"Database error during upsert_issues: {e}")
+        raise
     finally:
         conn.close()
 
-def insert_image(submission_id, title, label, image_data):
+def _put_variants(variants):
+    # {variant: bytes} -> {variant: blob hash}
+    return {variant: blob_store.put(data) for variant, data in (variants or {}).items()}
+
+def _store_image_extras(cur, owner_type, items):
+    # items: (owner_id, {variant: blob hash}, attachment_name, attachment_etag)
+    # A replaced image may have fewer variants (smaller or undecodable), so drop the old set first
+    cur.executemany(
+        'DELETE FROM image_variants WHERE owner_type = ? AND owner_id = ?',
+        [(owner_type, owner_id) for owner_id, _, _, _ in items])
+    cur.executemany(
+        '''
+        INSERT OR REPLACE INTO image_variants (owner_type, owner_id, variant, image_hash) VALUES (?, ?, ?, ?)
+        ''', [(owner_type, owner_id, variant, digest)
+              for owner_id, variants, _, _ in items
+              for variant, digest in variants.items()])
+    cur.executemany(
+        '''
+        INSERT OR REPLACE INTO attachments (owner_type, owner_id, name, etag) VALUES (?, ?, ?, ?)
+        ''', [(owner_type, owner_id, name, etag) for owner_id, _, name, etag in items if name])
+
+@_timed
+def save_image_batch(images):
+    """Store downloaded issue images with their variants and attachment versions in one transaction."""
+    if not images:
+        return
+    # Files are written before the transaction opens, so it only carries hashes
+    rows = [(image['submission_id'], image['title'], image.get('label'), blob_store.put(image['image_data']))
+            for image in images]
+    extras = [
+        (image['submission_id'], _put_variants(image.get('variants')), image.get('attachment_name'), image.get('attachment_etag'))
+        for image in images
+    ]
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute(
+        cur.executemany(
             '''
-            INSERT OR IGNORE INTO images (submission_id, title, label, image) VALUES (?, ?, ?, ?)
-            ''', (submission_id, title, label, image_data))
+            INSERT OR REPLACE INTO images (submission_id, title, label, image_hash) VALUES (?, ?, ?, ?)
+            ''', rows)
+        _store_image_extras(cur, 'issue', extras)
+        _link_images_to_issues(cur)
         conn.commit()
-        logging.info(f"Image '{title}' inserted successfully for submission ID {submission_id}.")
+        logger.info(f"Stored {len(images)} images.")
     except sqlite3.Error as e:
-        logging.error(f"Database error during insert_image: {e}")
+        conn.rollback()
+        logger.error(f"Database error during save_image_batch: {e}")
+        raise
     finally:
         conn.close()
 
-def insert_response(response):
+@_timed
+def upsert_responses(responses):
+    """Insert new responses and update changed ones in a single transaction.
+
+    A response without new image bytes keeps the image already stored.
+    Returns the KEYs of the responses that were inserted or changed.
+    """
+    if not responses:
+        return []
+    compared = [column for column in RESPONSE_COLUMNS if column not in ('KEY', 'action_image_hash')]
+    assignments = ',\n                '.join(
+        f"{column} = excluded.{column}" for column in compared
+    )
+    # Files are written before the transaction opens, so it only carries hashes
+    image_hashes = [blob_store.put(response['action_image']) if response.get('action_image') else None
+                    for response in responses]
+    rows = [
+        tuple(digest if column == 'action_image_hash' else response.get(column) for column in RESPONSE_COLUMNS)
+        for response, digest in zip(responses, image_hashes)
+    ]
+    extras = [
+        (response.get('KEY'), _put_variants(response.get('variants')), response.get('attachment_name'), response.get('attachment_etag'))
+        for response, digest in zip(responses, image_hashes) if digest
+    ]
+    query = f'''
+        INSERT INTO responses ({', '.join(f'"{column}"' for column in RESPONSE_COLUMNS)})
+        VALUES ({', '.join('?' * len(RESPONSE_COLUMNS))})
+        ON CONFLICT("KEY") DO UPDATE SET
+            {assignments},
+            action_image_hash = COALESCE(excluded.action_image_hash, responses.action_image_hash)
+        WHERE excluded.action_image_hash IS NOT NULL AND excluded.action_image_hash IS NOT responses.action_image_hash
+            OR ({', '.join(f'responses.{column}' for column in compared)})
+            IS NOT ({', '.join(f'excluded.{column}' for column in compared)})
+    '''
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute(
-            '''
-            INSERT OR REPLACE INTO responses (
-                SubmissionDate,
-                entity_problem,
-                action_role,
-                action_status,
-                action_action_taken,
-                action_image,
-                action_resolution_costusd,
-                action_resolution_timeframe,
-                action_recommended_contact,
-                "KEY",
-                SubmitterName
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                response.get('SubmissionDate'),
-                response.get('entity_problem'),
-                response.get('action_role'),
-                response.get('action_status'),
-                response.get('action_action_taken'),
-                response.get('action_image'),
-                response.get('action_resolution_costusd'),
-                response.get('action_resolution_timeframe'),
-                response.get('action_recommended_contact'),
-                response.get('KEY'),
-                response.get('SubmitterName')
-            )
-        )
+        # One statement per row: rowcount is 0 when the conflict update was skipped
+        written = []
+        for response, row in zip(responses, rows):
+            cur.execute(query, row)
+            if cur.rowcount:
+                written.append(response.get('KEY'))
+        _store_image_extras(cur, 'response', extras)
         conn.commit()
-        logging.info(f"Response with KEY {response.get('KEY')} inserted/updated successfully.")
+        logger.info(f"Upserted {len(written)} of {len(responses)} responses.")
+        return written
     except sqlite3.Error as e:
-        logging.error(f"Database error during insert_response: {e}")
+        conn.rollback()
+        logger.error(f"Database error during upsert_responses: {e}")
+        raise
     finally:
         conn.close()
 
-def get_issues_with_images(search_query='', state_filter='', severity_filter='', timeframe_filter='', start_date='', end_date=''):
+@_timed
+def get_stored_attachments(owner_type):
     conn = get_db_connection()
     cur = conn.cursor()
+    cur.execute('SELECT owner_id, name, etag FROM attachments WHERE owner_type = ?', (owner_type,))
+    rows = cur.fetchall()
+    conn.close()
+    return {row['owner_id']: {'name': row['name'], 'etag': row['etag']} for row in rows}
 
-    query = '''
-        SELECT issues.*, images.image
-        FROM issues
-        LEFT JOIN images ON issues.label = images.title
-        WHERE 1=1
-    '''
+def _fts_query(search_query):
+    # Every word must match, each as a prefix ("pot hol" finds "pothole")
+    terms = search_query.split()
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+# Kanban columns and the sort keys usable for keyset pagination
+BOARD_COLUMNS = ('new', 'open', 'waiting', 'fixed')
+ISSUE_SORT_KEYS = ('created_at', 'updated_at', 'label')
+
+_HAS_RESPONSES = 'EXISTS (SELECT 1 FROM responses r WHERE r.entity_problem = issues.id)'
+
+# Values looked up per matching issue through indexes, so callers don't need a
+# query per issue
+ISSUE_DERIVED_FIELDS = {
+    'image_submission_id': '''(
+                SELECT images.submission_id FROM images
+                WHERE images.issue_id = issues.id
+                ORDER BY images.submission_id
+                LIMIT 1
+            )''',
+    # Content hash of the same image, used to version its URLs
+    'image_hash': '''(
+                SELECT images.image_hash FROM images
+                WHERE images.issue_id = issues.id
+                ORDER BY images.submission_id
+                LIMIT 1
+            )''',
+    'response_count': '''(
+                SELECT COUNT(*) FROM responses r
+                WHERE r.entity_problem = issues.id
+            )''',
+    'latest_response_status': '''(
+                SELECT r.action_status
+                FROM responses r
+                WHERE r.entity_problem = issues.id
+                ORDER BY r.SubmissionDate DESC
+                LIMIT 1
+            )''',
+}
+
+def _parse_sort(sort):
+    # 'created_at' sorts ascending, '-created_at' descending
+    key = sort.lstrip('-')
+    if key not in ISSUE_SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {key}")
+    return key, sort.startswith('-')
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Invalid cursor")
+    return values
+
+def _filter_clauses(search_query='', state_filter='', severity_filter='', timeframe_filter='', start_date='', end_date='',
+                    column='', ids=None):
+    """Return (joins, where, params) restricting `issues` to the given filters."""
+    joins = ''
+    where = ' WHERE 1=1'
     params = []
 
-    # Existing filters
-    if search_query:
-        query += ' AND (LOWER(issues.label) LIKE ? OR LOWER(issues.description) LIKE ? OR LOWER(issues.type) LIKE ?)'
-        params.extend(['%' + search_query.lower() + '%'] * 3)
+    # Search goes through the full-text index
+    fts_query = _fts_query(search_query) if search_query else ''
+    if fts_query:
+        joins += ' JOIN issues_fts ON issues_fts.rowid = issues.rowid AND issues_fts MATCH ?'
+        params.append(fts_query)
 
     if state_filter:
-        query += ' AND LOWER(issues.status) = ?'
+        where += ' AND issues.status_norm = ?'
         params.append(state_filter.lower())
 
     if severity_filter:
-        query += ' AND LOWER(issues.severity) = ?'
+        where += ' AND issues.severity_norm = ?'
         params.append(severity_filter.lower())
 
     if timeframe_filter:
-        query += ' AND LOWER(issues.timeframe) = ?'
+        where += ' AND issues.timeframe_norm = ?'
         params.append(timeframe_filter.lower())
 
-    # Apply date filters on created_at
+    # Apply date filters on created_at ('YYYY-MM-DD HH:MM:SS' sorts as text,
+    # so comparing the raw column keeps the index usable)
     if start_date:
-        query += ' AND DATE(issues.created_at) >= DATE(?)'
+        where += ' AND issues.created_at >= DATE(?)'
         params.append(start_date)
 
     if end_date:
-        query += ' AND DATE(issues.created_at) <= DATE(?)'
+        where += " AND issues.created_at < DATE(?, '+1 day')"
         params.append(end_date)
 
-    logging.info(f"Executing query: {query} with params: {params}")
+    if ids is not None:
+        where += f" AND issues.id IN ({', '.join('?' * len(ids))})"
+        params.extend(ids)
 
-    cur.execute(query, params)
-    # ... rest of the code ...
+    # Board column, matching how the API maps issues onto the Kanban board:
+    # issues without responses, or with an unknown status, are new
+    if column:
+        if column not in BOARD_COLUMNS:
+            raise ValueError(f"Unknown board column: {column}")
+        if column == 'new':
+            others = ', '.join('?' * (len(BOARD_COLUMNS) - 1))
+            where += f' AND (NOT {_HAS_RESPONSES} OR issues.status_norm IS NULL OR issues.status_norm NOT IN ({others}))'
+            params.extend(BOARD_COLUMNS[1:])
+        else:
+            where += f' AND issues.status_norm = ? AND {_HAS_RESPONSES}'
+            params.append(column)
+
+    return joins, where, params
+
+@_timed
+def _select_issues(search_query='', state_filter='', severity_filter='', timeframe_filter='', start_date='', end_date='',
+                   column='', ids=None, fields=None, sort=None, cursor=None, limit=None):
+    if fields is None:
+        # Listed explicitly so the *_norm filter columns stay internal
+        columns = [f'issues.{name}' for name in ISSUE_COLUMNS]
+        derived = list(ISSUE_DERIVED_FIELDS)
+    else:
+        # id, status and created_at are always needed to place the issue on the board
+        wanted = set(fields) | {'id', 'status', 'created_at'}
+        if sort:
+            wanted.add(_parse_sort(sort)[0])
+        columns = [f'issues.{name}' for name in ISSUE_COLUMNS if name in wanted]
+        derived = [name for name in ISSUE_DERIVED_FIELDS if name in wanted or name == 'response_count']
+    select = ',\n            '.join(columns + [f'{ISSUE_DERIVED_FIELDS[name]} AS {name}' for name in derived])
+
+    joins, where, params = _filter_clauses(
+        search_query=search_query, state_filter=state_filter, severity_filter=severity_filter,
+        timeframe_filter=timeframe_filter, start_date=start_date, end_date=end_date, column=column, ids=ids
+    )
+    query = f'''
+        SELECT {select}
+        FROM issues
+    ''' + joins + where
+
+    if sort:
+        key, descending = _parse_sort(sort)
+        if cursor:
+            # Keyset pagination: continue strictly after the last row of the previous page
+            query += f" AND (issues.{key}, issues.id) {'<' if descending else '>'} (?, ?)"
+            params.extend(decode_cursor(cursor))
+        direction = 'DESC' if descending else 'ASC'
+        query += f' ORDER BY issues.{key} {direction}, issues.id {direction}'
+    elif search_query and _fts_query(search_query):
+        # Best matches first
+        query += ' ORDER BY issues_fts.rank'
 
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
 
+    logger.debug("Executing query: %s with params: %s", query, params)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
     cur.execute(query, params)
     rows = cur.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
 
+def get_issues_with_images(search_query='', state_filter='', severity_filter='', timeframe_filter='', start_date='', end_date='',
+                           column='', fields=None, sort=None):
+    return _select_issues(
+        search_query=search_query, state_filter=state_filter, severity_filter=severity_filter,
+        timeframe_filter=timeframe_filter, start_date=start_date, end_date=end_date,
+        column=column, fields=fields, sort=sort
+    )
+
+def get_issues_by_ids(ids, fields=None, **filters):
+    """Return the issues among `ids` that match the given filters."""
     issues = []
-    for row in rows:
-        issue = dict(row)
-        if issue['image']:
-            issue['image'] = base64.b64encode(issue['image']).decode('utf-8')  # Convert image to base64
+    for chunk in _chunks(list(ids)):
+        issues.extend(_select_issues(ids=chunk, fields=fields, **filters))
+    return issues
+
+@_timed
+def get_issue_ids_for_images(submission_ids):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    issue_ids = []
+    for chunk in _chunks(list(submission_ids)):
+        cur.execute(
+            f"SELECT DISTINCT issue_id FROM images WHERE issue_id IS NOT NULL AND submission_id IN ({', '.join('?' * len(chunk))})",
+            chunk)
+        issue_ids.extend(row['issue_id'] for row in cur.fetchall())
+    conn.close()
+    return issue_ids
+
+# Status shown on the board and map: issues without responses, or with an
+# unknown status, are new
+_BOARD_STATUS = f'''CASE
+            WHEN NOT {_HAS_RESPONSES} THEN 'new'
+            WHEN issues.status_norm IN ('open', 'waiting', 'fixed') THEN issues.status_norm
+            ELSE 'new'
+        END'''
+
+# Map clustering: grid cells are roughly this many pixels wide on screen, and
+# from this zoom level on every issue is returned individually
+CLUSTER_CELL_PIXELS = 60
+CLUSTER_MAX_ZOOM = 17
+MAX_MAP_POINTS = 5000
+
+@_timed
+def get_issue_locations(west, south, east, north, zoom, grid=None, **filters):
+    """Return issues inside a bounding box, grouped into grid clusters below CLUSTER_MAX_ZOOM.
+
+    Cells holding a single issue are returned as that issue (id/lat/lon/status),
+    the rest as {lat, lon, count} clusters placed at their members' mean position.
+    With grid=n the box is split into n x n cells anchored at its south-west
+    corner and its north/east edges are exclusive, so adjacent tiles neither
+    share issues nor split a cell between them.
+    """
+    joins, where, params = _filter_clauses(**filters)
+    where += ' AND issues_geo.max_lat >= ? AND issues_geo.min_lat <= ? AND issues_geo.max_lon >= ? AND issues_geo.min_lon <= ?'
+    params.extend([south, north, west, east])
+    if grid:
+        where += ' AND issues.latitude < ? AND issues.longitude < ?'
+        params.extend([north, east])
+    source = f'FROM issues JOIN issues_geo ON issues_geo.id = issues.rowid{joins}{where}'
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    clusters = []
+    issues = []
+    if zoom >= CLUSTER_MAX_ZOOM:
+        cur.execute(f'''
+            SELECT issues.id, issues.latitude AS lat, issues.longitude AS lon, {_BOARD_STATUS} AS status
+            {source}
+            LIMIT ?
+        ''', params + [MAX_MAP_POINTS])
+        issues = [dict(row) for row in cur.fetchall()]
+    else:
+        if grid:
+            origin_lat, origin_lon = south, west
+            cell_lat, cell_lon = (north - south) / grid, (east - west) / grid
+        else:
+            # Degrees covered by one cell at this zoom level (256px Web Mercator tiles)
+            origin_lat, origin_lon = -90, -180
+            cell_lat = cell_lon = CLUSTER_CELL_PIXELS * 360.0 / (256 * 2 ** zoom)
+        cur.execute(f'''
+            SELECT
+                CAST((issues.latitude - ?) / ? AS INTEGER) AS cell_y,
+                CAST((issues.longitude - ?) / ? AS INTEGER) AS cell_x,
+                COUNT(*) AS count,
+                AVG(issues.latitude) AS lat,
+                AVG(issues.longitude) AS lon,
+                MIN(issues.id) AS id,
+                MIN({_BOARD_STATUS}) AS status
+            {source}
+            GROUP BY cell_y, cell_x
+        ''', [origin_lat, cell_lat, origin_lon, cell_lon] + params)
+        for row in cur.fetchall():
+            if row['count'] == 1:
+                issues.append({'id': row['id'], 'lat': row['lat'], 'lon': row['lon'], 'status': row['status']})
+            else:
+                clusters.append({'lat': row['lat'], 'lon': row['lon'], 'count': row['count']})
+    conn.close()
+    return {'zoom': zoom, 'clusters': clusters, 'issues': issues}
+
+# Dimensions kept in issue_stats; 'all' has a single row with the overall totals
+STATS_DIMENSIONS = ('status', 'severity', 'type', 'timeframe')
+
+# Hours from an issue being reported to its first 'fixed' response, for issues
+# that are currently fixed
+_RESOLUTION_HOURS = f'''CASE WHEN {_BOARD_STATUS} = 'fixed' THEN MAX(0, 24 * (
+            julianday((SELECT MIN(r.SubmissionDate) FROM responses r
+                       WHERE r.entity_problem = issues.id AND LOWER(TRIM(r.action_status)) = 'fixed'))
+            - julianday(issues.created_at)))
+        END'''
+
+def _apply_issue_facts(cur, issue_ids, sign):
+    # Adds (sign=1) or removes (sign=-1) the stored facts of these issues from the totals
+    placeholders = ', '.join('?' * len(issue_ids))
+    for dimension in ('all',) + STATS_DIMENSIONS:
+        value = "''" if dimension == 'all' else dimension
+        cur.execute(f'''
+            INSERT INTO issue_stats (dimension, value, issue_count, total_cost, total_saved, resolved_count, total_resolution_hours)
+            SELECT ?, {value}, ? * COUNT(*), ? * TOTAL(cost), ? * TOTAL(saved),
+                   ? * COUNT(resolution_hours), ? * TOTAL(resolution_hours)
+            FROM issue_facts
+            WHERE issue_id IN ({placeholders})
+            GROUP BY 1, 2
+            ON CONFLICT(dimension, value) DO UPDATE SET
+                issue_count = issue_count + excluded.issue_count,
+                total_cost = total_cost + excluded.total_cost,
+                total_saved = total_saved + excluded.total_saved,
+                resolved_count = resolved_count + excluded.resolved_count,
+                total_resolution_hours = total_resolution_hours + excluded.total_resolution_hours
+        ''', [dimension] + [sign] * 5 + list(issue_ids))
+
+def _refresh_issue_facts(cur, issue_ids):
+    _apply_issue_facts(cur, issue_ids, -1)
+    placeholders = ', '.join('?' * len(issue_ids))
+    cur.execute(f'DELETE FROM issue_facts WHERE issue_id IN ({placeholders})', issue_ids)
+    cur.execute(f'''
+        INSERT INTO issue_facts (issue_id, status, severity, type, timeframe, cost, saved, resolution_hours)
+        SELECT
+            issues.id,
+            {_BOARD_STATUS},
+            COALESCE(issues.severity_norm, ''),
+            LOWER(TRIM(COALESCE(issues.type, ''))),
+            COALESCE(issues.timeframe_norm, ''),
+            CAST(NULLIF(TRIM(issues.costusd), '') AS REAL),
+            CAST(NULLIF(TRIM(issues.savedusd), '') AS REAL),
+            {_RESOLUTION_HOURS}
+        FROM issues
+        WHERE issues.id IN ({placeholders})
+    ''', issue_ids)
+    _apply_issue_facts(cur, issue_ids, 1)
+    cur.execute('DELETE FROM issue_stats WHERE issue_count = 0')
+
+@_timed
+def refresh_issue_stats(issue_ids):
+    """Recompute the statistics contribution of the given issues after they or their responses changed."""
+    issue_ids = sorted({issue_id for issue_id in issue_ids if issue_id})
+    if not issue_ids:
+        return
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for chunk in _chunks(issue_ids):
+            _refresh_issue_facts(cur, chunk)
+        conn.commit()
+        logger.info(f"Refreshed statistics for {len(issue_ids)} issues.")
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Database error during refresh_issue_stats: {e}")
+        raise
+    finally:
+        conn.close()
+
+def _summarize_stats(rows):
+    # rows: (dimension, value, issue_count, total_cost, total_saved, resolved_count, total_resolution_hours)
+    stats = {'total': 0, 'total_cost': 0.0, 'total_saved': 0.0,
+             'resolution': {'resolved': 0, 'average_hours': None}}
+    stats.update({f'by_{dimension}': {} for dimension in STATS_DIMENSIONS})
+    for dimension, value, count, cost, saved, resolved, hours in rows:
+        if dimension == 'all':
+            stats.update(total=count, total_cost=cost, total_saved=saved)
+            stats['resolution'] = {'resolved': resolved, 'average_hours': hours / resolved if resolved else None}
         else:
-            issue['image'] = None
-        issues.append(issue)
+            stats[f'by_{dimension}'][value] = count
+    return stats
+
+@_timed
+def get_issue_stats(**filters):
+    """Return issue counts per status/severity/type/timeframe, cost totals and time to resolution.
 
+    Unfiltered requests read the precomputed totals; filtered ones aggregate
+    issue_facts for the matching issues.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    if not any(filters.values()):
+        cur.execute('''
+            SELECT dimension, value, issue_count, total_cost, total_saved, resolved_count, total_resolution_hours
+            FROM issue_stats
+        ''')
+        rows = cur.fetchall()
+    else:
+        joins, where, params = _filter_clauses(**filters)
+        rows = []
+        for dimension in ('all',) + STATS_DIMENSIONS:
+            value = "''" if dimension == 'all' else f'issue_facts.{dimension}'
+            cur.execute(f'''
+                SELECT ?, {value}, COUNT(*), TOTAL(issue_facts.cost), TOTAL(issue_facts.saved),
+                       COUNT(issue_facts.resolution_hours), TOTAL(issue_facts.resolution_hours)
+                FROM issues JOIN issue_facts ON issue_facts.issue_id = issues.id{joins}{where}
+                GROUP BY 1, 2
+            ''', [dimension] + params)
+            rows.extend(cur.fetchall())
     conn.close()
-    return issues
+    return _summarize_stats([tuple(row) for row in rows])
 
+def get_issue_page(limit, cursor=None, sort=None, **filters):
+    """Return one keyset-paginated page of issues and the cursor for the next one."""
+    sort = sort or '-created_at'
+    key, _ = _parse_sort(sort)
+    rows = _select_issues(sort=sort, cursor=cursor, limit=limit + 1, **filters)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][key], rows[-1]['id']])
+    return {'issues': rows, 'next_cursor': next_cursor}
+
+@_timed
 def get_responses_for_issue(issue_id):
     conn = get_db_connection()
     cur = conn.cursor()
 
+    # Image bytes are served separately; the hash versions the image URL
     query = '''
-        SELECT *
+        SELECT SubmissionDate, entity_problem, action_role, action_status,
+            action_action_taken, action_resolution_costusd, action_resolution_timeframe,
+            action_recommended_contact, "KEY", SubmitterName,
+            action_image_hash
         FROM responses
         WHERE entity_problem = ?
         ORDER BY SubmissionDate DESC
@@ -218,18 +951,225 @@ def get_responses_for_issue(issue_id):
     cur.execute(query, (issue_id,))
     rows = cur.fetchall()
 
-    responses = []
-    for row in rows:
-        response = dict(row)
-        if response['action_image']:
-            response['action_image'] = base64.b64encode(response['action_image']).decode('utf-8')
-        else:
-            response['action_image'] = None
-        responses.append(response)
+    responses = [dict(row) for row in rows]
 
     conn.close()
     return responses
 
+def _get_image_variant(cur, owner_type, owner_id, variant):
+    cur.execute(
+        'SELECT image_hash FROM image_variants WHERE owner_type = ? AND owner_id = ? AND variant = ?',
+        (owner_type, owner_id, variant))
+    row = cur.fetchone()
+    return row['image_hash'] if row else None
+
+# Image lookups return {'hash', 'source_hash', 'updated_at'}: the file to serve
+# (the variant when one exists) and the original it was made from. Bytes are
+# read from blob_store.
+
+@_timed
+def get_issue_image(submission_id, variant=None):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT image_hash FROM images WHERE submission_id = ?', (submission_id,))
+    row = cur.fetchone()
+    # Fall back to the original when no smaller variant was generated
+    digest = _get_image_variant(cur, 'issue', submission_id, variant) if row and variant else None
+    conn.close()
+    if row and row['image_hash']:
+        return {'hash': digest or row['image_hash'], 'source_hash': row['image_hash'], 'updated_at': None}
+    return None
+
+@_timed
+def get_response_image(response_key, variant=None):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT action_image_hash, SubmissionDate FROM responses WHERE "KEY" = ?', (response_key,))
+    row = cur.fetchone()
+    digest = _get_image_variant(cur, 'response', response_key, variant) if row and variant else None
+    conn.close()
+    if row and row['action_image_hash']:
+        return {'hash': digest or row['action_image_hash'], 'source_hash': row['action_image_hash'],
+                'updated_at': row['SubmissionDate']}
+    return None
+
+def prune_unreferenced_blobs():
+    """Delete stored image files no row refers to any more (replaced or removed images).
+
+    Files newer than BLOB_PRUNE_GRACE_SECONDS are left alone, so a sync running
+    in another worker can't lose files it has written but not yet committed.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT image_hash FROM images WHERE image_hash IS NOT NULL
+        UNION SELECT action_image_hash FROM responses WHERE action_image_hash IS NOT NULL
+        UNION SELECT image_hash FROM image_variants WHERE image_hash IS NOT NULL
+    ''')
+    referenced = {row[0] for row in cur.fetchall()}
+    conn.close()
+    removed = blob_store.remove_unreferenced(referenced, min_age=BLOB_PRUNE_GRACE_SECONDS)
+    if removed:
+        logger.info(f"Removed {removed} unreferenced image files.")
+    return removed
+
+def get_sync_cursor(feed):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT cursor FROM sync_state WHERE feed = ?', (feed,))
+    row = cur.fetchone()
+    conn.close()
+    return row['cursor'] if row else None
+
+def set_sync_cursor(feed, cursor):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            '''
+            INSERT OR REPLACE INTO sync_state (feed, cursor, synced_at) VALUES (?, ?, ?)
+            ''', (feed, cursor, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+        logger.info(f"Sync cursor for {feed} set to {cursor}.")
+    except sqlite3.Error as e:
+        logger.error(f"Database error during set_sync_cursor: {e}")
+    finally:
+        conn.close()
+
+def _now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+def _sync_job_from_row(row):
+    job = dict(row)
+    job['full_refresh'] = bool(job['full_refresh'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def enqueue_sync_job(trigger, full_refresh=False):
+    """Queue a sync unless one is already queued or running.
+
+    Returns (job, created); when a sync is already pending, that job is
+    returned with created=False.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            '''
+            INSERT INTO sync_jobs (trigger, full_refresh, status, created_at) VALUES (?, ?, 'queued', ?)
+            ON CONFLICT DO NOTHING
+            ''', (trigger, int(full_refresh), _now()))
+        created = cur.rowcount == 1
+        conn.commit()
+        cur.execute("SELECT * FROM sync_jobs WHERE status IN ('queued', 'running')")
+        row = cur.fetchone()
+        return (_sync_job_from_row(row) if row else None), created
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Database error during enqueue_sync_job: {e}")
+        raise
+    finally:
+        conn.close()
+
+def claim_sync_job():
+    """Mark the queued sync job as running and return it, or None if there is none."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM sync_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+        row = cur.fetchone()
+        if not row:
+            return None
+        # Guarded on status in case another worker claimed it first
+        cur.execute("UPDATE sync_jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                    (_now(), row['id']))
+        conn.commit()
+        if cur.rowcount != 1:
+            return None
+        cur.execute('SELECT * FROM sync_jobs WHERE id = ?', (row['id'],))
+        return _sync_job_from_row(cur.fetchone())
+    finally:
+        conn.close()
+
+def finish_sync_job(job_id, result=None, error=None):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            '''
+            UPDATE sync_jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?
+            ''', ('failed' if error else 'succeeded', _now(),
+                  json.dumps(result) if result is not None else None, error, job_id))
+        # Nothing else removes jobs, and each one carries its result
+        cur.execute(
+            '''
+            DELETE FROM sync_jobs WHERE status IN ('succeeded', 'failed') AND finished_at < DATETIME('now', ?)
+            ''', (f'-{SYNC_JOB_RETENTION_DAYS} days',))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error during finish_sync_job: {e}")
+    finally:
+        conn.close()
+
+def fail_interrupted_sync_jobs():
+    # Jobs left running by a worker that died; without this they would block new syncs
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE sync_jobs SET status = 'failed', finished_at = ?, error = 'Interrupted' WHERE status = 'running'",
+                (_now(),))
+    conn.commit()
+    conn.close()
+    return cur.rowcount
+
+def get_sync_job(job_id):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM sync_jobs WHERE id = ?', (job_id,))
+    row = cur.fetchone()
+    conn.close()
+    return _sync_job_from_row(row) if row else None
+
+def get_last_finished_sync_job_id():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT MAX(id) FROM sync_jobs WHERE status IN ('succeeded', 'failed')")
+    row = cur.fetchone()
+    conn.close()
+    return row[0] or 0
+
+def get_finished_sync_jobs(after_id):
+    """Return jobs finished since `after_id`, oldest first."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT * FROM sync_jobs WHERE id > ? AND status IN ('succeeded', 'failed') ORDER BY id",
+        (after_id,))
+    rows = cur.fetchall()
+    conn.close()
+    return [_sync_job_from_row(row) for row in rows]
+
+def save_metrics_snapshot(source, snapshot):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            'INSERT OR REPLACE INTO metrics_snapshots (source, snapshot, updated_at) VALUES (?, ?, ?)',
+            (source, json.dumps(snapshot), _now()))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error during save_metrics_snapshot: {e}")
+    finally:
+        conn.close()
+
+def get_metrics_snapshots():
+    """Return {source: snapshot} for every published metrics snapshot."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT source, snapshot FROM metrics_snapshots')
+    rows = cur.fetchall()
+    conn.close()
+    return {row['source']: json.loads(row['snapshot']) for row in rows}
+
 def get_latest_update_time():
     conn = get_db_connection()
     cur = conn.cursor()
@@ -243,4 +1183,4 @@ def get_latest_update_time():
 if __name__ == "__main__":
     # Initialize the database and ensure tables exist
     init_db()
-    logging.info("Database setup complete.")
+    logger.info("Database setup complete.")
@@ -1,39 +1,229 @@
-from flask import Flask, render_template, jsonify, request
-from database import get_issues_with_images, get_responses_for_issue, init_db
+from flask import Flask, render_template, jsonify, request, url_for, abort, send_file, g
+from database import (
+    ISSUE_COLUMNS,
+    BOARD_COLUMNS,
+    get_issues_with_images,
+    get_issues_by_ids,
+    get_issue_ids_for_images,
+    get_issue_page,
+    get_issue_locations,
+    get_issue_stats,
+    get_responses_for_issue,
+    get_issue_image,
+    get_response_image,
+    enqueue_sync_job,
+    get_sync_job,
+    get_finished_sync_jobs,
+    get_last_finished_sync_job_id,
+    get_metrics_snapshots,
+    blob_store,
+    init_db
+)
+import os
+import gzip
+import json
 import logging
+import hashlib
+import time
+import threading
+import multiprocessing
 import traceback
-from utils.odk_api import ODKAPI
-from flask_socketio import SocketIO
+from datetime import datetime
+from utils.cache import ResponseCache
+from utils.tiles import TILE_GRID, tile_bounds, locations_to_geojson
+from utils.log_config import configure_logging
+from utils.metrics import REGISTRY, HTTP_REQUEST_SECONDS, HTTP_RESPONSE_BYTES, render as render_metrics
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from apscheduler.schedulers.background import BackgroundScheduler
 
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
 app = Flask(__name__)
 socketio = SocketIO(app)
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging()
+
+# Serialized /api/issues and /api/responses payloads, dropped after every sync
+api_cache = ResponseCache(max_entries=int(os.getenv('API_CACHE_SIZE', '256')))
+# Map tiles are many and small; kept apart so panning doesn't evict the board and stats
+tile_cache = ResponseCache(max_entries=int(os.getenv('TILE_CACHE_SIZE', '1024')))
+
+def invalidate_caches():
+    # After a sync every cached payload is stale
+    api_cache.bump_generation()
+    tile_cache.bump_generation()
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Route templates rather than paths, so ids don't create a series each
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                     route=route, method=request.method, status=response.status_code)
+        length = response.calculate_content_length()
+        if length:
+            HTTP_RESPONSE_BYTES.inc(length, route=route)
+    return response
+
+# Bodies smaller than this aren't worth compressing
+COMPRESSION_MIN_SIZE = 1024
+
+def _negotiate_encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def _encoded_body(entry, encoding):
+    # Compressed bodies are kept on the cache entry so each is only built once
+    encoded = entry['encoded'].get(encoding)
+    if encoded is None:
+        if encoding == 'br':
+            encoded = brotli.compress(entry['body'], quality=5)
+        else:
+            encoded = gzip.compress(entry['body'], compresslevel=6)
+        entry['encoded'][encoding] = encoded
+    return encoded
+
+def _cached_json(key, build, mimetype='application/json', cache=api_cache):
+    # build() returns the payload to serialize; ValueError becomes a 400
+    entry = cache.get(key)
+    if entry is None:
+        generation = cache.generation
+        try:
+            payload = build()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        body = json.dumps(payload).encode('utf-8')
+        entry = {'body': body, 'etag': hashlib.sha1(body).hexdigest(), 'encoded': {}}
+        cache.set(key, entry, generation)
+
+    response = app.response_class(entry['body'], mimetype=mimetype)
+    # Weak ETag: gzip, brotli and identity bodies are the same representation
+    response.set_etag(entry['etag'], weak=True)
+    response.last_modified = cache.updated_at
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    encoding = _negotiate_encoding()
+    if encoding and len(entry['body']) >= COMPRESSION_MIN_SIZE:
+        response.set_data(_encoded_body(entry, encoding))
+        response.content_encoding = encoding
+    return response
+
+# Syncs run in worker.py; this process only queues them and applies their results.
+# 'external' means the worker is started separately instead of as a child process.
+SYNC_WORKER = os.getenv('SYNC_WORKER', 'process').strip().lower()
+# Newest finished sync job whose results this process has applied
+last_sync_job_id = 0
+# Worker child process, when this process started one
+sync_worker_process = None
+scheduler = None
+_background_lock = threading.Lock()
+
+def request_sync(trigger, full_refresh=False):
+    job, created = enqueue_sync_job(trigger, full_refresh=full_refresh)
+    if created:
+        logging.info(f"Queued sync job {job['id']} ({trigger})")
+    else:
+        logging.info(f"Sync job {job['id']} already {job['status']}, not queueing another ({trigger})")
+    return job, created
+
+def apply_finished_sync_jobs():
+    # Polled from the scheduler: drop cached responses and notify clients once per finished sync
+    global last_sync_job_id
+    _check_sync_worker()
+    try:
+        for job in get_finished_sync_jobs(last_sync_job_id):
+            last_sync_job_id = job['id']
+            if job['status'] != 'succeeded':
+                logging.error(f"Sync job {job['id']} failed: {job['error']}")
+                continue
+            invalidate_caches()
+            broadcast_changes(job['result'])
+    except Exception as e:
+        logging.error(f"Error applying finished sync jobs: {str(e)}")
+        logging.error(traceback.format_exc())
 
 def initialize_data():
+    global last_sync_job_id
     try:
-        init_db()
-        api = ODKAPI()
-        api.update_existing_issues_and_responses()
-        app.logger.info("Initial data loaded successfully")
-        socketio.emit('data_updated', {'message': 'Data has been updated'})
+        # Results of syncs from before this process started are already in the database
+        last_sync_job_id = get_last_finished_sync_job_id()
+        request_sync('startup')
     except Exception as e:
         app.logger.error(f"Error during initialization: {str(e)}")
         app.logger.error(traceback.format_exc())
 
 def scheduled_data_refresh():
     try:
-        logging.info("Starting scheduled data refresh")
-        api = ODKAPI()
-        api.update_existing_issues_and_responses()
-        logging.info("Scheduled data refresh completed successfully")
-        socketio.emit('data_updated', {'message': 'Data has been updated'})
+        request_sync('scheduled')
     except Exception as e:
         logging.error(f"Error during scheduled data refresh: {str(e)}")
         logging.error(traceback.format_exc())
 
+def start_sync_worker():
+    global sync_worker_process
+    # Imported here so the worker's ODK client is only loaded when needed
+    from worker import run_worker
+    # Spawned rather than forked so the child doesn't inherit pooled SQLite connections
+    process = multiprocessing.get_context('spawn').Process(target=run_worker, name='sync-worker', daemon=True)
+    process.start()
+    logging.info(f"Started sync worker process {process.pid}")
+    sync_worker_process = process
+    return process
+
+def _check_sync_worker():
+    # Restart a worker child that exited; queued jobs would otherwise wait forever
+    process = sync_worker_process
+    if process is None or process.is_alive():
+        return
+    logging.error(f"Sync worker process {process.pid} exited with code {process.exitcode}, restarting it")
+    try:
+        start_sync_worker()
+    except Exception as e:
+        logging.error(f"Error restarting sync worker: {str(e)}")
+        logging.error(traceback.format_exc())
+
+def start_background_tasks():
+    """Start the sync worker (unless external), the scheduler and the sync result poller.
+
+    Runs once per process, from the first request or from __main__, so it
+    works under `flask run` as well as `python main.py`.
+    """
+    global scheduler
+    with _background_lock:
+        if scheduler is not None:
+            return
+        init_db()
+        if SYNC_WORKER != 'external':
+            start_sync_worker()
+        initialize_data()
+
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(scheduled_data_refresh, 'interval', hours=1)  # Adjust the interval as needed
+        scheduler.add_job(apply_finished_sync_jobs, 'interval', seconds=2)
+        scheduler.start()
+
+@app.before_request
+def _ensure_background_tasks():
+    # Test clients (benchmarks) drive syncs themselves
+    if scheduler is None and not app.testing:
+        start_background_tasks()
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -50,6 +240,66 @@ def theory_of_change():
 def project_data():
     return render_template('project_data.html')
 
+# Fields that can be requested with ?fields= on /api/issues
+ISSUE_FIELDS = ISSUE_COLUMNS + ('image_url', 'image_thumbnail_url', 'response_count', 'latest_response_status')
+MAX_PAGE_SIZE = 200
+
+def _parse_fields(value):
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in ISSUE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def _present_issue(issue, fields=None):
+    # Issues without any responses are always shown as new
+    if not issue['response_count']:
+        issue['status'] = 'new'
+    status_mapping = {
+        'new': 'new',
+        'open': 'open',
+        'waiting': 'waiting',
+        'fixed': 'fixed',
+    }
+    issue['status'] = status_mapping.get((issue['status'] or '').lower(), 'new')
+    # Ensure created_at is included in the response
+    if 'created_at' not in issue:
+        issue['created_at'] = issue.get('updated_at', 'Unknown')
+    # Images are fetched by the browser from the image endpoint
+    submission_id = issue.pop('image_submission_id', None)
+    version = _image_version(issue.pop('image_hash', None))
+    issue['image_url'] = url_for('issue_image', submission_id=submission_id, v=version) if submission_id else None
+    issue['image_thumbnail_url'] = url_for('issue_image', submission_id=submission_id, size='thumbnail', v=version) if submission_id else None
+    if fields is not None:
+        return {field: issue.get(field) for field in ['id', 'status'] + fields}
+    return issue
+
+def _db_fields(fields):
+    # Image URLs are built from the image's submission id and content hash
+    if fields is None:
+        return None
+    db_fields = [field for field in fields if not field.startswith('image_')]
+    if any(field.startswith('image_') for field in fields):
+        db_fields += ['image_submission_id', 'image_hash']
+    return db_fields
+
+def _load_issues(sort, cursor, limit, fields, **filters):
+    db_fields = _db_fields(fields)
+
+    if limit:
+        # Paged responses are wrapped so the next cursor can be returned
+        page = get_issue_page(min(max(limit, 1), MAX_PAGE_SIZE), cursor=cursor, sort=sort, fields=db_fields, **filters)
+        page['issues'] = [_present_issue(issue, fields) for issue in page['issues']]
+        logging.info(f"Returning page of {len(page['issues'])} issues")
+        return page
+
+    issues_with_images = get_issues_with_images(sort=sort, fields=db_fields, **filters)
+    issues_with_images = [_present_issue(issue, fields) for issue in issues_with_images]
+    logging.info(f"Returning {len(issues_with_images)} issues")
+    return issues_with_images
+
 @app.route('/api/issues', methods=['GET'])
 def get_issues():
     try:
@@ -60,71 +310,343 @@ def get_issues():
         timeframe_filter = request.args.get('timeframe', '').strip().lower()
         start_date = request.args.get('start_date', '').strip()
         end_date = request.args.get('end_date', '').strip()
-        logging.info(f"Received filters: search='{search_query}', state='{state_filter}', severity='{severity_filter}', timeframe='{timeframe_filter}', start_date='{start_date}', end_date='{end_date}'")
+        # Board column, sort key ('created_at' or '-created_at'), projection and paging
+        column = request.args.get('column', '').strip().lower()
+        sort = request.args.get('sort', '').strip() or None
+        cursor = request.args.get('cursor', '').strip() or None
+        limit = request.args.get('limit', type=int)
+        logging.info(f"Received filters: search='{search_query}', state='{state_filter}', severity='{severity_filter}', timeframe='{timeframe_filter}', start_date='{start_date}', end_date='{end_date}', column='{column}', sort='{sort}', limit={limit}")
 
-        # Pass all relevant filters to the function
-        issues_with_images = get_issues_with_images(
+        fields_param = request.args.get('fields', '').strip()
+
+        # Filters are normalized above, so equivalent requests share a cache entry
+        cache_key = ('issues', search_query, state_filter, severity_filter, timeframe_filter,
+                     start_date, end_date, column, sort, cursor, limit, fields_param)
+        return _cached_json(cache_key, lambda: _load_issues(
             search_query=search_query,
             state_filter=state_filter,
             severity_filter=severity_filter,
             timeframe_filter=timeframe_filter,
             start_date=start_date,
-            end_date=end_date
-        )
-
-        for issue in issues_with_images:
-            # Check if the issue has any responses
-            responses = get_responses_for_issue(issue['id'])
-            if not responses:
-                issue['status'] = 'new'
-            status_mapping = {
-                'new': 'new',
-                'open': 'open',
-                'waiting': 'waiting',
-                'fixed': 'fixed',
-            }
-            issue['status'] = status_mapping.get(issue['status'].lower(), 'new')
-            # Ensure created_at is included in the response
-            if 'created_at' not in issue:
-                issue['created_at'] = issue.get('updated_at', 'Unknown')
-
-        logging.info(f"Returning {len(issues_with_images)} issues")
-        return jsonify(issues_with_images)
+            end_date=end_date,
+            column=column,
+            sort=sort,
+            cursor=cursor,
+            limit=limit,
+            fields=_parse_fields(fields_param)
+        ))
     except Exception as e:
         logging.error(f"Error fetching issues: {str(e)}")
         logging.error(traceback.format_exc())
         return jsonify({"error": "An error occurred while fetching issues"}), 500
 
+def _parse_bbox(value):
+    # west,south,east,north in degrees; defaults to the whole world
+    if not value:
+        return -180.0, -90.0, 180.0, 90.0
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError("bbox must be west,south,east,north")
+    if west > east or south > north:
+        raise ValueError("bbox must be west,south,east,north")
+    return max(west, -180.0), max(south, -90.0), min(east, 180.0), min(north, 90.0)
+
+@app.route('/api/issues/geo', methods=['GET'])
+def get_issue_geo():
+    try:
+        filters = {name: request.args.get(param, '').strip().lower() for param, name in SUBSCRIPTION_FILTERS.items()}
+        bbox = request.args.get('bbox', '').strip()
+        zoom = max(0, min(request.args.get('zoom', 2, type=int), 22))
+        cache_key = ('geo', bbox, zoom, tuple(sorted(filters.items())))
+        return _cached_json(cache_key, lambda: get_issue_locations(*_parse_bbox(bbox), zoom, **filters))
+    except Exception as e:
+        logging.error(f"Error fetching issue locations: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": "An error occurred while fetching issue locations"}), 500
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    try:
+        filters = {name: request.args.get(param, '').strip().lower() for param, name in SUBSCRIPTION_FILTERS.items()}
+        cache_key = ('stats', tuple(sorted(filters.items())))
+        return _cached_json(cache_key, lambda: get_issue_stats(**filters))
+    except Exception as e:
+        logging.error(f"Error fetching statistics: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": "An error occurred while fetching statistics"}), 500
+
+@app.route('/tiles/issues/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_issue_tile(z, x, y):
+    # GeoJSON tile of clustered issue points; tiles are cached until the next sync
+    try:
+        filters = {name: request.args.get(param, '').strip().lower() for param, name in SUBSCRIPTION_FILTERS.items()}
+        cache_key = ('tile', z, x, y, tuple(sorted(filters.items())))
+
+        def build():
+            west, south, east, north = tile_bounds(z, x, y)
+            locations = get_issue_locations(west, south, east, north, z, grid=TILE_GRID, **filters)
+            return locations_to_geojson(locations)
+
+        return _cached_json(cache_key, build, mimetype='application/geo+json', cache=tile_cache)
+    except Exception as e:
+        logging.error(f"Error building issue tile {z}/{x}/{y}: {str(e)}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": "An error occurred while building the issue tile"}), 500
+
+def _load_responses(issue_id):
+    responses = get_responses_for_issue(issue_id)
+    for response in responses:
+        version = _image_version(response.pop('action_image_hash', None))
+        response['action_image_url'] = url_for('response_image', response_key=response['KEY'], v=version) if version else None
+        response['action_image_preview_url'] = url_for('response_image', response_key=response['KEY'], size='medium', v=version) if version else None
+    return responses
+
 @app.route('/api/responses/<issue_id>', methods=['GET'])
 def get_responses(issue_id):
     try:
-        responses = get_responses_for_issue(issue_id)
-        return jsonify(responses)
+        return _cached_json(('responses', issue_id), lambda: _load_responses(issue_id))
     except Exception as e:
         logging.error(f"Error fetching responses for issue {issue_id}: {str(e)}")
         logging.error(traceback.format_exc())
         return jsonify({"error": "An error occurred while fetching responses"}), 500
 
+IMAGE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+IMAGE_SIZES = ('thumbnail', 'medium')
+IMAGE_VERSION_LENGTH = 12
+
+def _guess_image_mimetype(data):
+    if data.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+def _image_version(digest):
+    # Short content hash put in image URLs as ?v=, so a replaced attachment gets a new URL
+    return digest[:IMAGE_VERSION_LENGTH] if digest else None
+
+def _image_response(image):
+    digest = image['hash']
+    header = blob_store.read_header(digest)
+    if header is None:
+        logging.error(f"Image file {digest} is missing from the blob store")
+        abort(404)
+    last_modified = None
+    if image.get('updated_at'):
+        try:
+            last_modified = datetime.fromisoformat(image['updated_at'])
+        except ValueError:
+            pass
+    # URLs name the submission, not the content, and an edited submission replaces
+    # its image. Only a URL carrying the current version can be cached for good;
+    # others are revalidated against the ETag on every use.
+    versioned = request.args.get('v') == _image_version(image['source_hash'])
+    # send_file streams from disk and answers conditional/range requests itself
+    response = send_file(blob_store.path(digest), mimetype=_guess_image_mimetype(header), etag=digest,
+                         last_modified=last_modified, max_age=IMAGE_CACHE_MAX_AGE if versioned else 0,
+                         conditional=True)
+    response.cache_control.public = True
+    if versioned:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/images/<submission_id>', methods=['GET'])
+def issue_image(submission_id):
+    size = request.args.get('size')
+    image = get_issue_image(submission_id, variant=size if size in IMAGE_SIZES else None)
+    if not image:
+        abort(404)
+    return _image_response(image)
+
+@app.route('/api/responses/<response_key>/image', methods=['GET'])
+def response_image(response_key):
+    size = request.args.get('size')
+    image = get_response_image(response_key, variant=size if size in IMAGE_SIZES else None)
+    if not image:
+        abort(404)
+    return _image_response(image)
+
+def _present_sync_job(job):
+    return {
+        "job_id": job['id'],
+        "status": job['status'],
+        "trigger": job['trigger'],
+        "full_refresh": job['full_refresh'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "updated_issues": len(job['result']['issues']) if job['result'] else None,
+        "updated_images": len(job['result']['images']) if job['result'] else None,
+        "error": job['error'],
+        "status_url": url_for('get_sync_job_status', job_id=job['id'])
+    }
+
 @app.route('/update_odk', methods=['GET'])
 def update_odk():
     try:
-        logging.info("Starting ODK data update process")
-        api = ODKAPI()
-        result = api.update_existing_issues_and_responses()
-        logging.info(f"ODK update completed. Updated issues: {len(result.get('issues', []))}, Updated images: {len(result.get('images', []))}")
-        return jsonify({
-            "message": "ODK update completed successfully",
-            "updated_issues": len(result.get('issues', [])),
-            "updated_images": len(result.get('images', []))
-        })
+        # ?full=1 ignores the sync cursors and refetches every feed
+        full_refresh = request.args.get('full', '').strip().lower() in ('1', 'true', 'yes')
+        job, created = request_sync('manual', full_refresh=full_refresh)
+        body = _present_sync_job(job)
+        body["message"] = "ODK update queued" if created else "An ODK update is already in progress"
+        return jsonify(body), 202
     except Exception as e:
         logging.error(f"Error in update_odk route: {str(e)}")
         logging.error(traceback.format_exc())
         return jsonify({"error": "An error occurred while updating ODK data"}), 500
 
+# Live updates: clients subscribe with their current filters and are grouped
+# into one Socket.IO room per distinct filter set, so each sync runs one query
+# per room rather than one per viewer.
+SUBSCRIPTION_FILTERS = {
+    'search': 'search_query',
+    'state': 'state_filter',
+    'severity': 'severity_filter',
+    'timeframe': 'timeframe_filter',
+    'start_date': 'start_date',
+    'end_date': 'end_date',
+    'column': 'column',
+}
+# Above this many changed issues, clients are told to reload instead
+MAX_DELTA_ISSUES = 500
+
+live_rooms = {}
+live_subscribers = {}
+live_lock = threading.Lock()
+
+def _release_room(room):
+    info = live_rooms.get(room)
+    if info:
+        info['members'] -= 1
+        if info['members'] <= 0:
+            del live_rooms[room]
+
+@socketio.on('subscribe')
+def subscribe_to_issues(data):
+    data = data or {}
+    filters = {name: str(data.get(param) or '').strip().lower() for param, name in SUBSCRIPTION_FILTERS.items()}
+    try:
+        fields = _parse_fields(str(data.get('fields') or ''))
+    except ValueError as e:
+        emit('subscription_error', {'error': str(e)})
+        return
+    if filters['column'] and filters['column'] not in BOARD_COLUMNS:
+        emit('subscription_error', {'error': f"Unknown board column: {filters['column']}"})
+        return
+    room = 'issues:' + hashlib.sha1(json.dumps([filters, fields], sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    with live_lock:
+        previous = live_subscribers.get(request.sid)
+        if previous != room:
+            if previous:
+                leave_room(previous)
+                _release_room(previous)
+            join_room(room)
+            live_subscribers[request.sid] = room
+            info = live_rooms.setdefault(room, {'filters': filters, 'fields': fields, 'members': 0})
+            info['members'] += 1
+    emit('subscribed', {'room': room, 'generation': api_cache.generation})
+
+@socketio.on('disconnect')
+def unsubscribe_from_issues(*args):
+    with live_lock:
+        room = live_subscribers.pop(request.sid, None)
+        if room:
+            _release_room(room)
+
+def broadcast_changes(result):
+    """Send every subscribed room the issues a sync added, changed or moved out of its filters."""
+    result = result or {}
+    issues = result.get('issues', [])
+    responses = result.get('responses', [])
+    # ODK entity versions start at 1, so version 1 means the issue is new
+    added_ids = {issue['id'] for issue in issues if issue.get('version') == '1'}
+    changed_ids = {issue['id'] for issue in issues}
+    changed_ids.update(response['entity_problem'] for response in responses if response.get('entity_problem'))
+    changed_ids.update(get_issue_ids_for_images(result.get('images', {})))
+    generation = api_cache.generation
+
+    socketio.emit('data_updated', {'message': 'Data has been updated', 'generation': generation, 'changed': len(changed_ids)})
+    if not changed_ids:
+        return
+
+    with live_lock:
+        rooms = {room: dict(info) for room, info in live_rooms.items()}
+    if not rooms:
+        return
+
+    # url_for needs a request context to build image URLs
+    with app.test_request_context():
+        for room, info in rooms.items():
+            if len(changed_ids) > MAX_DELTA_ISSUES:
+                socketio.emit('issues_reload', {'generation': generation}, to=room)
+                continue
+            try:
+                matching = [
+                    _present_issue(issue, info['fields'])
+                    for issue in get_issues_by_ids(changed_ids, fields=_db_fields(info['fields']), **info['filters'])
+                ]
+                matched_ids = {issue['id'] for issue in matching}
+                socketio.emit('issues_delta', {
+                    'generation': generation,
+                    'added': [issue for issue in matching if issue['id'] in added_ids],
+                    'changed': [issue for issue in matching if issue['id'] not in added_ids],
+                    # Changed issues that no longer match this room's filters
+                    'removed': sorted(changed_ids - matched_ids),
+                    'responses': [
+                        {'issue_id': response['entity_problem'], 'KEY': response['KEY']}
+                        for response in responses if response.get('entity_problem') in matched_ids
+                    ]
+                }, to=room)
+            except Exception as e:
+                # One bad room must not stop the others from getting their delta
+                logging.error(f"Failed to send issue changes to {room}: {str(e)}")
+                logging.error(traceback.format_exc())
+
+@app.route('/api/sync/jobs/<int:job_id>', methods=['GET'])
+def get_sync_job_status(job_id):
+    job = get_sync_job(job_id)
+    if not job:
+        abort(404)
+    return jsonify(_present_sync_job(job))
+
+def _cache_metrics():
+    stats = {'api': api_cache.stats(), 'tiles': tile_cache.stats()}
+    def family(kind, documentation, key):
+        return {'type': kind, 'help': documentation,
+                'samples': [('', {'cache': name}, values[key]) for name, values in stats.items()]}
+    return {
+        'api_cache_hits_total': family('counter', 'API response cache hits.', 'hits'),
+        'api_cache_misses_total': family('counter', 'API response cache misses.', 'misses'),
+        'api_cache_evictions_total': family('counter', 'API response cache evictions.', 'evictions'),
+        'api_cache_entries': family('gauge', 'Entries in the API response cache.', 'entries'),
+        'api_cache_hit_ratio': family('gauge', 'Share of API cache lookups that hit.', 'hit_rate'),
+        'api_cache_generation': family('gauge', 'Syncs applied since the web process started.', 'generation'),
+    }
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # This process's metrics plus the latest snapshot published by the sync worker
+    snapshots = [({'process': 'web'}, REGISTRY.snapshot()), ({'process': 'web'}, _cache_metrics())]
+    try:
+        snapshots.extend(({'process': source}, snapshot) for source, snapshot in get_metrics_snapshots().items())
+    except Exception as e:
+        logging.error(f"Error loading worker metrics: {str(e)}")
+    return app.response_class(render_metrics(snapshots), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'api': api_cache.stats(), 'tiles': tile_cache.stats()})
+
 @app.route('/api/schedule', methods=['GET'])
 def get_schedule():
-    jobs = scheduler.get_jobs()
+    jobs = scheduler.get_jobs() if scheduler else []
     job_details = []
     for job in jobs:
         job_details.append({
@@ -136,11 +658,5 @@ def get_schedule():
     return jsonify(job_details)
 
 if __name__ == '__main__':
-    initialize_data()
-    
-    # Set up the scheduler
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(scheduled_data_refresh, 'interval', hours=1)  # Adjust the interval as needed
-    scheduler.start()
-    
+    start_background_tasks()
     socketio.run(app)
@@ -10,9 +10,17 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const resetFiltersButton = document.getElementById('reset-filters');
     resetFiltersButton.addEventListener('click', resetFilters);
+
+    initLiveUpdates();
 });
 
+let currentFilters = {};
+let currentIssues = [];
+let socket = null;
+
 async function loadIssues(filters = {}) {
+    currentFilters = filters;
+    subscribeToUpdates();
     try {
         const queryParams = new URLSearchParams(filters);
         console.log('Query Params:', queryParams.toString());
@@ -24,6 +32,7 @@ async function loadIssues(filters = {}) {
 
         const issues = await response.json();
         console.log('Issues fetched from API:', issues);
+        currentIssues = issues;
 
         updateIssuesList(issues);  // Update the issues list
         updateMap(issues);         // Update the map with the new issues
@@ -33,6 +42,42 @@ async function loadIssues(filters = {}) {
 }
 
 
+function initLiveUpdates() {
+    if (typeof io === 'undefined') {
+        return;
+    }
+    socket = io();
+    socket.on('connect', subscribeToUpdates);
+    socket.on('issues_delta', applyIssueDelta);
+    socket.on('issues_reload', () => loadIssues(currentFilters));
+}
+
+function subscribeToUpdates() {
+    // The server groups viewers with the same filters and sends them only what changed
+    if (socket && socket.connected) {
+        socket.emit('subscribe', currentFilters);
+    }
+}
+
+function applyIssueDelta(delta) {
+    console.log('Applying issue delta:', delta);
+    const removed = new Set(delta.removed);
+    const updates = new Map([...delta.added, ...delta.changed].map(issue => [issue.id, issue]));
+
+    currentIssues = currentIssues
+        .filter(issue => !removed.has(issue.id))
+        .map(issue => {
+            const updated = updates.get(issue.id);
+            updates.delete(issue.id);
+            return updated || issue;
+        });
+    // Whatever is left is new to this view
+    currentIssues = [...updates.values(), ...currentIssues];
+
+    updateIssuesList(currentIssues);
+    updateMap(currentIssues);
+}
+
 function applyFiltersAndSort() {
     const searchQuery = document.getElementById('search-input').value.trim().toLowerCase();
     const stateFilter = document.getElementById('state-filter').value.trim().toLowerCase();
@@ -76,8 +121,8 @@ function updateIssuesList(issues, append = false) {
 
         // Build issue card content
         let imageHtml = '';
-        if (issue.image) {
-            imageHtml = `<img src="data:image/jpeg;base64,${issue.image}" alt="${issue.label}" class="issue-image" onerror="this.style.display='none';" />`;
+        if (issue.image_url) {
+            imageHtml = `<img src="${issue.image_thumbnail_url}" alt="${issue.label}" class="issue-image" loading="lazy" onerror="this.style.display='none';" />`;
         }
 
         const createdDate = new Date(issue.created_at).toLocaleString();
@@ -105,8 +150,8 @@ async function openModal(issue) {
     const modalContent = document.getElementById('modal-content');
 
     let imageHtml = '';
-    if (issue.image) {
-        imageHtml = `<img src="data:image/jpeg;base64,${issue.image}" alt="${issue.label}" class="issue-image">`;
+    if (issue.image_url) {
+        imageHtml = `<img src="${issue.image_url}" alt="${issue.label}" class="issue-image">`;
     }
 
     const createdDate = new Date(issue.created_at).toLocaleString();
@@ -152,10 +197,10 @@ function updateCarousel(responseData) {
         slide.className = 'carousel-slide';
 
         let imageHtml = '';
-        if (response.action_image) {
+        if (response.action_image_url) {
             imageHtml = `
                 <div class="response-image-container">
-                    <img src="data:image/jpeg;base64,${response.action_image}" alt="Response Image" class="response-image">
+                    <a href="${response.action_image_url}" target="_blank"><img src="${response.action_image_preview_url}" alt="Response Image" class="response-image"></a>
                 </div>
             `;
         }
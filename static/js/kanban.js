@@ -4,62 +4,143 @@ document.addEventListener('DOMContentLoaded', () => {
     loadIssues();
     initModal();
     initDragAndDrop();
+    initLazyLoading();
     initFilterSort();
+    initLiveUpdates();
 });
 
+const BOARD_COLUMNS = ['new', 'open', 'waiting', 'fixed'];
+const PAGE_SIZE = 30;
+// Only the fields the cards and the detail modal use
+const CARD_FIELDS = [
+    'label', 'type', 'severity', 'timeframe', 'description', 'created_at', 'action_taken',
+    'costusd', 'recommended_contact', 'image_url', 'image_thumbnail_url'
+].join(',');
+
+let currentFilters = {};
+let boardGeneration = 0;
+const columnState = {};
+let socket = null;
+
 async function loadIssues(filters = {}) {
+    currentFilters = filters;
+    boardGeneration += 1;
+    subscribeToUpdates();
+    BOARD_COLUMNS.forEach(column => {
+        columnState[column] = { cursor: null, loading: false, done: false };
+        document.getElementById(`${column}-list`).innerHTML = '';
+    });
+    // Each column loads its first page independently; the rest loads on scroll
+    await Promise.all([loadColumnCounts(), ...BOARD_COLUMNS.map(column => loadColumnPage(column))]);
+}
+
+async function loadColumnCounts() {
+    // Totals come from the precomputed statistics, not from the loaded pages
+    const generation = boardGeneration;
     try {
-        let url = '/api/issues';
-        const params = new URLSearchParams(filters);
-        if (params.toString()) {
-            url += '?' + params.toString();
+        const response = await fetch(`/api/stats?${new URLSearchParams(currentFilters)}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const stats = await response.json();
+        if (generation !== boardGeneration) {
+            return;
         }
+        BOARD_COLUMNS.forEach(column => {
+            document.getElementById(`${column}-count`).textContent = `(${stats.by_status[column] || 0})`;
+        });
+    } catch (error) {
+        console.error('Error loading column counts:', error);
+    }
+}
+
+async function loadColumnPage(column) {
+    const state = columnState[column];
+    if (state.loading || state.done) {
+        return;
+    }
+    state.loading = true;
+    const generation = boardGeneration;
+    try {
+        const params = new URLSearchParams({ ...currentFilters, column, limit: PAGE_SIZE, fields: CARD_FIELDS });
+        if (state.cursor) {
+            params.set('cursor', state.cursor);
+        }
+        const url = '/api/issues?' + params.toString();
         console.log('Fetching issues with URL:', url);
         const response = await fetch(url);
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
-        let issues = await response.json();
-        console.log('Fetched issues:', issues);
-        updateKanbanBoard(issues);
+        const page = await response.json();
+        // Ignore pages that arrive after the filters changed
+        if (generation !== boardGeneration) {
+            return;
+        }
+        const list = document.getElementById(`${column}-list`);
+        page.issues.forEach(issue => list.appendChild(createIssueCard(issue)));
+        state.cursor = page.next_cursor;
+        state.done = !page.next_cursor;
     } catch (error) {
         console.error('Error loading issues:', error);
+    } finally {
+        if (generation === boardGeneration) {
+            state.loading = false;
+        }
+    }
+}
+
+function initLazyLoading() {
+    BOARD_COLUMNS.forEach(column => {
+        const list = document.getElementById(`${column}-list`);
+        list.addEventListener('scroll', () => {
+            if (list.scrollTop + list.clientHeight >= list.scrollHeight - 200) {
+                loadColumnPage(column);
+            }
+        });
+    });
+}
+
+function initLiveUpdates() {
+    if (typeof io === 'undefined') {
+        return;
+    }
+    socket = io();
+    socket.on('connect', subscribeToUpdates);
+    socket.on('issues_delta', applyIssueDelta);
+    socket.on('issues_reload', () => loadIssues(currentFilters));
+}
+
+function subscribeToUpdates() {
+    // The server groups viewers with the same filters and sends them only what changed
+    if (socket && socket.connected) {
+        socket.emit('subscribe', { ...currentFilters, fields: CARD_FIELDS });
     }
 }
 
-function updateKanbanBoard(issues) {
-    console.log('Updating Kanban board with issues:', issues);
-    const newList = document.getElementById('new-list');
-    const openList = document.getElementById('open-list');
-    const waitingList = document.getElementById('waiting-list');
-    const fixedList = document.getElementById('fixed-list');
-
-    newList.innerHTML = '';
-    openList.innerHTML = '';
-    waitingList.innerHTML = '';
-    fixedList.innerHTML = '';
-
-    issues.forEach(issue => {
-        const issueCard = createIssueCard(issue);
-        switch (issue.status.toLowerCase()) {
-            case 'new':
-                newList.appendChild(issueCard);
-                break;
-            case 'open':
-                openList.appendChild(issueCard);
-                break;
-            case 'waiting':
-                waitingList.appendChild(issueCard);
-                break;
-            case 'fixed':
-                fixedList.appendChild(issueCard);
-                break;
-            default:
-                newList.appendChild(issueCard);
+function applyIssueDelta(delta) {
+    console.log('Applying issue delta:', delta);
+    delta.removed.forEach(issueId => {
+        const card = document.querySelector(`.issue-card[data-issue-id="${issueId}"]`);
+        if (card) {
+            card.remove();
         }
     });
 
-    initDragAndDrop();
+    [...delta.added, ...delta.changed].forEach(issue => {
+        const existing = document.querySelector(`.issue-card[data-issue-id="${issue.id}"]`);
+        const list = document.getElementById(`${issue.status}-list`) || document.getElementById('new-list');
+        const card = createIssueCard(issue);
+        if (existing && existing.parentElement === list) {
+            existing.replaceWith(card);
+        } else {
+            if (existing) {
+                existing.remove();
+            }
+            list.insertBefore(card, list.firstChild);
+        }
+    });
+    loadColumnCounts();
 }
 
 function createIssueCard(issue) {
@@ -69,8 +150,8 @@ function createIssueCard(issue) {
     card.dataset.issueId = issue.id;
 
     const title = issue.label || 'Untitled Issue';
-    const imageHtml = issue.image 
-        ? `<img src="data:image/jpeg;base64,${issue.image}" alt="${title}" class="issue-image" onerror="this.style.display='none';" />`
+    const imageHtml = issue.image_url 
+        ? `<img src="${issue.image_thumbnail_url}" alt="${title}" class="issue-image" loading="lazy" onerror="this.style.display='none';" />`
         : '';
 
     const createdDate = new Date(issue.created_at).toLocaleString();
@@ -89,6 +170,15 @@ function createIssueCard(issue) {
         openModal(issue);
     });
 
+    card.addEventListener('dragstart', () => {
+        card.classList.add('dragging');
+    });
+
+    card.addEventListener('dragend', () => {
+        card.classList.remove('dragging');
+        updateIssueStatus(card);
+    });
+
     return card;
 }
 
@@ -132,8 +222,8 @@ async function openModal(issue) {
     const modal = document.getElementById('kanban-issue-modal');
     const modalContent = document.getElementById('kanban-modal-issue-details');
 
-    const imageHtml = issue.image 
-        ? `<img src="data:image/jpeg;base64,${issue.image}" alt="${issue.label}" class="issue-image" onerror="this.style.display='none';" />`
+    const imageHtml = issue.image_url 
+        ? `<img src="${issue.image_url}" alt="${issue.label}" class="issue-image" onerror="this.style.display='none';" />`
         : '';
 
     modalContent.innerHTML = `
@@ -185,10 +275,10 @@ function updateCarousel(responseData) {
         slide.className = 'carousel-slide';
 
         let imageHtml = '';
-        if (response.action_image) {
+        if (response.action_image_url) {
             imageHtml = `
                 <div class="response-image-container">
-                    <img src="data:image/jpeg;base64,${response.action_image}" alt="Response Image" class="response-image">
+                    <a href="${response.action_image_url}" target="_blank"><img src="${response.action_image_preview_url}" alt="Response Image" class="response-image"></a>
                 </div>
             `;
         }
@@ -275,20 +365,9 @@ function initModal() {
 }
 
 function initDragAndDrop() {
-    const draggables = document.querySelectorAll('.issue-card');
+    // Cards register their own drag handlers in createIssueCard
     const dropzones = document.querySelectorAll('.issue-list');
 
-    draggables.forEach(draggable => {
-        draggable.addEventListener('dragstart', () => {
-            draggable.classList.add('dragging');
-        });
-
-        draggable.addEventListener('dragend', () => {
-            draggable.classList.remove('dragging');
-            updateIssueStatus(draggable);
-        });
-    });
-
     dropzones.forEach(dropzone => {
         dropzone.addEventListener('dragover', e => {
             e.preventDefault();
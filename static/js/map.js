@@ -1,7 +1,50 @@
 // static/js/map.js
 
 let map;
-let markers = [];
+let issueTiles;
+let issuesById = new Map();
+let mapFitted = false;
+
+// Loads GeoJSON tiles of clustered issues for the tiles on screen and keeps
+// one set of markers per tile, dropped again when Leaflet unloads the tile
+const IssueTileLayer = L.GridLayer.extend({
+    initialize(options) {
+        L.GridLayer.prototype.initialize.call(this, options);
+        this._tileMarkers = {};
+        this.on('tileunload', event => this._removeMarkers(this._tileCoordsToKey(event.coords)));
+    },
+
+    createTile(coords, done) {
+        const tile = document.createElement('div');
+        const key = this._tileCoordsToKey(coords);
+        const params = new URLSearchParams(currentFilters);
+        fetch(`/tiles/issues/${coords.z}/${coords.x}/${coords.y}?${params}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`API Error: ${response.statusText}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                // The tile may have been unloaded while the request was in flight
+                if (this._tiles[key]) {
+                    this._removeMarkers(key);
+                    this._tileMarkers[key] = data.features.map(createFeatureMarker);
+                }
+                done(null, tile);
+            })
+            .catch(error => {
+                console.error('Error loading issue tile:', error);
+                done(error, tile);
+            });
+        return tile;
+    },
+
+    _removeMarkers(key) {
+        (this._tileMarkers[key] || []).forEach(marker => map.removeLayer(marker));
+        delete this._tileMarkers[key];
+    }
+});
 
 function initMap() {
     // Initialize the map and set its view to the chosen geographical coordinates and a zoom level
@@ -15,38 +58,59 @@ function initMap() {
         tileSize: 256,
         zoomOffset: 0
     }).addTo(map);
+
+    issueTiles = new IssueTileLayer({ maxZoom: 19, noWrap: true }).addTo(map);
 }
 
-// Function to update map markers based on issue data
+// Called whenever the loaded issue list changes; the list is only used for popups
 function updateMap(issues) {
-    // Clear existing markers
-    markers.forEach(marker => map.removeLayer(marker));
-    markers = [];
-
-    // Add new markers based on issues data
-    issues.forEach(issue => {
-        if (issue.latitude && issue.longitude) {
-            const marker = L.marker([issue.latitude, issue.longitude]).addTo(map);
-            const popupContent = `
-                <b>${issue.label}</b><br>
-                ${issue.description}<br>
-                Status: ${issue.status}<br>
-            `;
-            marker.bindPopup(popupContent);
-            markers.push(marker);
-
-            // Highlight the issue card when marker is clicked
-            marker.on('click', () => {
-                highlightIssue(issue.id);
-            });
+    issuesById = new Map(issues.map(issue => [issue.id, issue]));
+    if (!mapFitted) {
+        const points = issues
+            .filter(issue => issue.latitude && issue.longitude)
+            .map(issue => [issue.latitude, issue.longitude]);
+        if (points.length > 0) {
+            mapFitted = true;
+            map.fitBounds(L.latLngBounds(points));
         }
-    });
+    }
+    // Filters or data changed: refetch the visible tiles
+    issueTiles.redraw();
+}
 
-    // Adjust map to fit all markers
-    if (markers.length > 0) {
-        const group = new L.featureGroup(markers);
-        map.fitBounds(group.getBounds());
+function createFeatureMarker(feature) {
+    const [lon, lat] = feature.geometry.coordinates;
+    const props = feature.properties;
+
+    if (props.cluster) {
+        const size = props.count < 10 ? 30 : props.count < 100 ? 36 : 44;
+        const marker = L.marker([lat, lon], {
+            icon: L.divIcon({
+                className: 'marker-cluster',
+                html: `<div>${props.count}</div>`,
+                iconSize: [size, size]
+            })
+        }).addTo(map);
+        // Zoom in towards the cluster to split it up
+        marker.on('click', () => map.setView([lat, lon], map.getZoom() + 2));
+        return marker;
     }
+
+    const marker = L.marker([lat, lon]).addTo(map);
+    const issue = issuesById.get(feature.id);
+    if (issue) {
+        marker.bindPopup(`
+            <b>${issue.label}</b><br>
+            ${issue.description}<br>
+            Status: ${issue.status}<br>
+        `);
+    }
+
+    // Highlight the issue card when marker is clicked
+    marker.on('click', () => {
+        highlightIssue(feature.id);
+    });
+    return marker;
 }
 
 function highlightIssue(issueId) {
@@ -2,17 +2,32 @@ function initStatistics() {
     const statsContainer = document.getElementById('statistics');
     statsContainer.innerHTML = '<h2>Statistics</h2><div id="stats-content"></div>';
   }
-  
-  function updateStatistics(issues) {
+
+  // Summary figures come precomputed from the server rather than from the full issue list
+  async function loadStatistics(filters = {}) {
+    try {
+        const response = await fetch(`/api/stats?${new URLSearchParams(filters)}`);
+        if (!response.ok) {
+            throw new Error(`API Error: ${response.statusText}`);
+        }
+        updateStatistics(await response.json());
+    } catch (error) {
+        console.error('Error loading statistics:', error);
+    }
+  }
+
+  function updateStatistics(stats) {
     const statsContent = document.getElementById('stats-content');
-    const totalIssues = issues.length;
-    const openIssues = issues.filter(issue => issue.state === 'open').length;
-    const resolvedIssues = issues.filter(issue => issue.state === 'resolved').length;
-  
+    const byStatus = stats.by_status;
+    const averageHours = stats.resolution.average_hours;
+    const averageResolution = averageHours === null ? 'n/a' : `${(averageHours / 24).toFixed(1)} days`;
+
     statsContent.innerHTML = `
-        <p>Total Issues: ${totalIssues}</p>
-        <p>Open Issues: ${openIssues}</p>
-        <p>Resolved Issues: ${resolvedIssues}</p>
+        <p>Total Issues: ${stats.total}</p>
+        <p>Open Issues: ${(byStatus.new || 0) + (byStatus.open || 0) + (byStatus.waiting || 0)}</p>
+        <p>Resolved Issues: ${byStatus.fixed || 0}</p>
+        <p>Average Time to Resolution: ${averageResolution}</p>
+        <p>Total Cost (USD): ${stats.total_cost.toFixed(2)}</p>
+        <p>Total Saved (USD): ${stats.total_saved.toFixed(2)}</p>
     `;
   }
-  
\ No newline at end of file
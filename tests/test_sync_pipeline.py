@@ -0,0 +1,79 @@
+"""Full and incremental syncs through SyncPipeline against the mock ODK Central.
+
+    python -m unittest tests.test_sync_pipeline
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.mock_odk import MockODKData, MockODKServer
+
+class SyncPipelineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.mkdtemp(prefix='odk-sync-test-')
+        # Small pages so every feed spans several of them
+        cls.data = MockODKData(issues=60, responses=90, photo_size=(400, 300), seed=7)
+        cls.server = MockODKServer(cls.data).__enter__()
+        # Settings are read at import time, so set them before loading the sync
+        os.environ.update({
+            'ODK_BASE_URL': cls.server.url,
+            'API_EMAIL': 'test@example.com',
+            'API_PASSWORD': 'test',
+            'DATABASE_PATH': os.path.join(cls.workdir, 'issues.db'),
+            'BLOB_STORE_PATH': os.path.join(cls.workdir, 'blobs'),
+            'ODK_PAGE_SIZE': '25',
+        })
+        os.environ.setdefault('LOG_LEVEL', 'ERROR')
+        global database, odk_api, odk_pipeline
+        import database
+        from utils import odk_api, odk_pipeline
+        database.init_db()
+        cls.api = odk_api.ODKAPI(download_concurrency=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__(None, None, None)
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def sync(self, incremental):
+        return asyncio.run(odk_pipeline.SyncPipeline(self.api, incremental).run())
+
+    def latest(self, feed, records):
+        # What the cursor should be: the newest of the feed's __system timestamps
+        fields = odk_api.SYNC_FEEDS[feed]
+        return max(record['__system'][field] for record in records for field in fields
+                   if record['__system'].get(field))
+
+    def assertCursors(self):
+        self.assertEqual(database.get_sync_cursor('problems'), self.latest('problems', self.data.entities))
+        self.assertEqual(database.get_sync_cursor('report_problem'), self.latest('report_problem', self.data.reports))
+        self.assertEqual(database.get_sync_cursor('address_problem'), self.latest('address_problem', self.data.responses))
+
+    def test_full_then_incremental(self):
+        result = self.sync(incremental=False)
+        self.assertEqual(len(result['issues']), 60)
+        self.assertEqual(len(result['images']), 60)
+        self.assertEqual(len(result['responses']), 90)
+        self.assertCursors()
+
+        # Nothing changed upstream, so nothing is written and the cursors stay put
+        result = self.sync(incremental=True)
+        self.assertEqual(result['issues'], [])
+        self.assertEqual(result['responses'], [])
+        self.assertCursors()
+
+        self.data.update_issues(5)
+        for issue_id in ('uuid:issue-1', 'uuid:issue-2', 'uuid:issue-3'):
+            self.data.add_response(issue_id)
+        result = self.sync(incremental=True)
+        self.assertEqual(len(result['issues']), 5)
+        self.assertEqual(sorted(response['KEY'] for response in result['responses']),
+                         ['uuid:response-90', 'uuid:response-91', 'uuid:response-92'])
+        self.assertCursors()
+
+if __name__ == '__main__':
+    unittest.main()
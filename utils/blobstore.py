@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+class BlobStore:
+    """Content-addressed files: each blob is stored once, named by its SHA-256.
+
+    Files live at <root>/<first 2 hex chars>/<hash> so no directory grows too
+    large. Blobs are never modified once written, which is what lets them be
+    served straight from disk with long-lived caching.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Store `data` if it isn't already present and return its hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        try:
+            # Already stored: mark it as recently written so a concurrent prune keeps it
+            os.utime(path)
+            return digest
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary name and rename, so readers never see a partial file
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            os.unlink(temporary)
+            raise
+        return digest
+
+    def read(self, digest):
+        try:
+            with open(self.path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read_header(self, digest, size=16):
+        # Enough bytes to sniff the file type without loading the image
+        try:
+            with open(self.path(digest), 'rb') as f:
+                return f.read(size)
+        except FileNotFoundError:
+            return None
+
+    def remove_unreferenced(self, referenced, min_age=0):
+        """Delete blobs whose hash is not in `referenced`. Returns how many were removed.
+
+        Blobs written or re-put within the last `min_age` seconds are kept, since
+        the rows referring to them may not be committed yet.
+        """
+        removed = 0
+        cutoff = time.time() - min_age
+        if not os.path.isdir(self.root):
+            return removed
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                # Skip in-progress writes as well as referenced blobs
+                if name.startswith('.tmp-') or name in referenced:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.unlink(path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Could not remove blob {name}: {str(e)}")
+        return removed
@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+class ResponseCache:
+    """Bounded LRU cache of serialized API responses.
+
+    Entries are only valid for the data generation they were built from; the
+    sync calls bump_generation() after writing, which drops everything.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        # When the current generation's data was written; used for Last-Modified
+        self.updated_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation):
+        with self._lock:
+            # Don't store results computed before the last sync finished
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump_generation(self):
+        with self._lock:
+            self.generation += 1
+            self.updated_at = datetime.now(timezone.utc).replace(microsecond=0)
+            self._entries.clear()
+            return self.generation
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
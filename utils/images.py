@@ -0,0 +1,43 @@
+import io
+import logging
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only originals are stored
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for each stored variant
+IMAGE_VARIANTS = {
+    'thumbnail': 240,
+    'medium': 960,
+}
+JPEG_QUALITY = 80
+
+def make_image_variants(image_data):
+    """Return a dict of variant name -> JPEG bytes for the given original image."""
+    if not image_data or Image is None:
+        return {}
+
+    try:
+        with Image.open(io.BytesIO(image_data)) as original:
+            # Phone photos usually carry their rotation in EXIF
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'L'):
+                original = original.convert('RGB')
+
+            variants = {}
+            for name, max_edge in IMAGE_VARIANTS.items():
+                # Don't upscale or re-encode images that are already small enough
+                if max(original.size) <= max_edge:
+                    continue
+                resized = original.copy()
+                resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                variants[name] = buffer.getvalue()
+            return variants
+    except Exception as e:
+        logger.warning(f"Failed to generate image variants: {str(e)}")
+        return {}
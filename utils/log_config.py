@@ -0,0 +1,47 @@
+import logging
+import os
+import threading
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Passed as `extra` on per-record messages so SampleFilter can thin them out
+SAMPLED = {'sampled': True}
+
+class SampleFilter(logging.Filter):
+    """Let through only one in `every` records of each sampled message."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.every == 1 or not getattr(record, 'sampled', False):
+            return True
+        # Counted per message template, so different messages don't crowd each other out
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+def configure_logging():
+    """Configure logging from the environment.
+
+    LOG_LEVEL sets the default level, LOG_LEVELS overrides it per logger
+    (e.g. "utils.odk_api=DEBUG,database=WARNING") and LOG_SAMPLE_EVERY keeps
+    one in N of each per-record message. Calling it again is harmless.
+    """
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format=LOG_FORMAT)
+    for entry in os.getenv('LOG_LEVELS', '').split(','):
+        name, _, level = entry.partition('=')
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    sample_filter = SampleFilter(int(os.getenv('LOG_SAMPLE_EVERY', '100')))
+    for handler in logging.getLogger().handlers:
+        # Safe to call more than once (the spawned worker re-imports main.py);
+        # stacked filters would sample the samples
+        if not any(isinstance(existing, SampleFilter) for existing in handler.filters):
+            handler.addFilter(sample_filter)
@@ -0,0 +1,161 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Each process keeps its own registry. The sync worker publishes snapshots
+through the database and the web process merges them into /metrics with a
+`process` label, so one scrape covers both.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds; wide enough for both single queries and whole syncs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [('', dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Decorator observing the wrapped function's duration."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, state['buckets']):
+                    samples.append(('_bucket', {**labels, 'le': repr(float(bound))}, count))
+                samples.append(('_bucket', {**labels, 'le': '+Inf'}, state['count']))
+                samples.append(('_sum', labels, state['sum']))
+                samples.append(('_count', labels, state['count']))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Modules may be imported more than once (e.g. by the worker); reuse the first
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of every metric's current samples."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {'type': metric.type, 'help': metric.documentation, 'samples': metric.samples()}
+            for metric in metrics
+        }
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def render(snapshots):
+    """Render [(extra_labels, snapshot), ...] as one Prometheus text exposition."""
+    families = {}
+    for extra_labels, snapshot in snapshots:
+        for name, family in snapshot.items():
+            merged = families.setdefault(name, {'type': family['type'], 'help': family['help'], 'samples': []})
+            for suffix, labels, value in family['samples']:
+                merged['samples'].append((suffix, {**extra_labels, **labels}, value))
+
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for suffix, labels, value in family['samples']:
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{suffix}{{{label_text}}} {float(value)!r}" if label_text
+                         else f"{name}{suffix} {float(value)!r}")
+    return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# Shared metric definitions, so every module records into the same families
+SYNC_STAGE_SECONDS = REGISTRY.histogram(
+    'odk_sync_stage_seconds', 'Time spent in each stage of an ODK sync.', ['stage'])
+ODK_REQUESTS = REGISTRY.counter(
+    'odk_requests_total', 'Requests made to ODK Central.', ['kind', 'status'])
+ODK_BYTES = REGISTRY.counter(
+    'odk_received_bytes_total', 'Response bytes received from ODK Central.', ['kind'])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'db_query_seconds', 'Time spent in database operations.', ['operation'])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency per route.', ['route', 'method', 'status'])
+HTTP_RESPONSE_BYTES = REGISTRY.counter(
+    'http_response_bytes_total', 'Response body bytes sent per route.', ['route'])
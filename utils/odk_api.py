@@ -1,34 +1,42 @@
 from dotenv import load_dotenv
 import os
-import json
+import asyncio
 import requests
 import traceback
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask
 from flask_socketio import SocketIO
 from urllib.parse import urljoin
 from database import (
-    insert_or_update_issue,
-    insert_image,
-    insert_response,
+    upsert_issues,
+    save_image_batch,
+    upsert_responses,
+    get_sync_cursor,
+    refresh_issue_stats,
     init_db
 )
+from utils.images import make_image_variants
+from utils.odk_pipeline import SyncPipeline
+from utils.log_config import SAMPLED, configure_logging
+from utils.metrics import SYNC_STAGE_SECONDS, ODK_REQUESTS, ODK_BYTES
 
 # Load environment variables from .env file
 # Initialize Flask and SocketIO
 app = Flask(__name__)
 socketio = SocketIO(app)
 
-
-
-# Initialize logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+# Logging is configured by the application (see utils.log_config); per-record
+# messages below are lazy %-style and sampled so a sync at INFO pays nothing for them
+logger = logging.getLogger(__name__)
 
 def initialize_data():
     try:
         init_db()
-        api = ODKAPI()
+        api = get_odk_client()
         api.update_existing_issues_and_responses()
         app.logger.info("Initial data loaded successfully")
         socketio.emit('data_updated', {'message': 'Data has been updated'})
@@ -36,12 +44,54 @@ def initialize_data():
         app.logger.error(f"Error during initialization: {str(e)}")
         app.logger.error(traceback.format_exc())
 
+# Feeds synced incrementally, with the __system timestamps that mark a record as new or changed
+SYNC_FEEDS = {
+    'problems': ('createdAt', 'updatedAt'),
+    'report_problem': ('submissionDate', 'updatedAt'),
+    'address_problem': ('submissionDate', 'updatedAt'),
+}
+
+# ODK Central server; pointed elsewhere for staging or the benchmark mock server
+ODK_BASE_URL = os.getenv('ODK_BASE_URL', 'https://integrityaction.net').rstrip('/')
+
+# Attachment download tuning, overridable from the environment
+DOWNLOAD_CONCURRENCY = int(os.getenv('ODK_DOWNLOAD_CONCURRENCY', '8'))
+MAX_RETRIES = int(os.getenv('ODK_MAX_RETRIES', '3'))
+RETRY_BACKOFF = float(os.getenv('ODK_RETRY_BACKOFF', '0.5'))
+# Tokens are renewed this long before ODK says they expire
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv('ODK_TOKEN_REFRESH_MARGIN', '300')))
+# Records requested per OData page; only one page is held in memory at a time
+PAGE_SIZE = int(os.getenv('ODK_PAGE_SIZE', '500'))
+
+def create_http_session(concurrency=DOWNLOAD_CONCURRENCY, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    # Keep-alive session; pool_block caps open connections per host at `concurrency`
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency, pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 class ODKAPI:
-    def __init__(self):
-        self.base_url = "https://integrityaction.net"
+    """ODK Central client. Logs in on first use and keeps the session token
+    until shortly before it expires or the server rejects it, so one instance
+    (see get_odk_client) can serve every sync."""
+
+    def __init__(self, download_concurrency=DOWNLOAD_CONCURRENCY):
+        self.base_url = ODK_BASE_URL
         self.session_token = None
-        self.login()
+        self.token_expires_at = None
+        self._auth_lock = threading.Lock()
+        self.download_concurrency = max(1, download_concurrency)
+        self.http = create_http_session(concurrency=self.download_concurrency)
 
+    @SYNC_STAGE_SECONDS.timed(stage='login')
     def login(self):
         login_url = urljoin(self.base_url, 'v1/sessions')
         credentials = {
@@ -49,24 +99,70 @@ class ODKAPI:
             "password": os.getenv('API_PASSWORD')
         }
         try:
-            logging.info("Attempting to log in to ODK API.")
-            response = requests.post(login_url, json=credentials)
-            logging.debug(f"Login response: {response.status_code} - {response.text}")
+            logger.info("Attempting to log in to ODK API.")
+            response = self.http.post(login_url, json=credentials)
+            ODK_REQUESTS.inc(kind='login', status=response.status_code)
+            logger.debug("Login response status code: %s", response.status_code)
             response.raise_for_status()
-            self.session_token = response.json().get('token')
+            session = response.json()
+            self.session_token = session.get('token')
             if not self.session_token:
-                logging.error("No token found in login response.")
+                logger.error("No token found in login response.")
                 raise ValueError("Authentication failed: No token provided.")
-            logging.info("Login successful.")
+            self.token_expires_at = self._parse_expiry(session.get('expiresAt'))
+            logger.info(f"Login successful, session valid until {self.token_expires_at or 'unknown'}.")
         except requests.exceptions.RequestException as e:
-            logging.error(f"Login failed: {str(e)}")
-            logging.error(traceback.format_exc())
+            logger.error(f"Login failed: {str(e)}")
+            logger.error(traceback.format_exc())
             raise
 
+    def _parse_expiry(self, expires_at):
+        if not expires_at:
+            return None
+        try:
+            return datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+        except ValueError:
+            logger.warning(f"Unrecognised session expiry: {expires_at}")
+            return None
+
+    def _session_valid(self):
+        if not self.session_token:
+            return False
+        if self.token_expires_at is None:
+            # Without an expiry, keep the token until the server rejects it
+            return True
+        return datetime.now(timezone.utc) < self.token_expires_at - TOKEN_REFRESH_MARGIN
+
+    def _current_token(self):
+        # Downloads run on several threads; only one of them logs in
+        with self._auth_lock:
+            if not self._session_valid():
+                self.login()
+            return self.session_token
+
+    def _renew_token(self, rejected_token):
+        with self._auth_lock:
+            # Another thread may already have replaced the rejected token
+            if self.session_token == rejected_token:
+                logger.info("ODK rejected the session token, logging in again.")
+                self.session_token = None
+                self.login()
+            return self.session_token
+
+    def _authorized_request(self, method, url, headers, kind, **kwargs):
+        # Sends with the cached token, re-authenticating once if ODK answers 401
+        token = self._current_token()
+        response = self.http.request(method, url, headers={**headers, "Authorization": f"Bearer {token}"}, **kwargs)
+        ODK_REQUESTS.inc(kind=kind, status=response.status_code)
+        if response.status_code == 401:
+            token = self._renew_token(token)
+            response = self.http.request(method, url, headers={**headers, "Authorization": f"Bearer {token}"}, **kwargs)
+            ODK_REQUESTS.inc(kind=kind, status=response.status_code)
+        ODK_BYTES.inc(len(response.content), kind=kind)
+        return response
+
     def _make_request(self, endpoint, method="GET", params=None, is_binary=False):
-        headers = {
-            "Authorization": f"Bearer {self.session_token}",
-        }
+        headers = {}
         if not is_binary:
             headers["Content-Type"] = "application/json"
 
@@ -76,59 +172,86 @@ class ODKAPI:
             url = urljoin(self.base_url + '/', endpoint.lstrip('/'))
 
         try:
-            logging.debug(f"Making API request: {method} {url}")
-            if params:
-                logging.debug(f"Request parameters: {json.dumps(params)}")
+            logger.debug("Making API request: %s %s params=%s", method, url, params)
 
-            response = requests.request(method, url, headers=headers, params=params)
-            logging.debug(f"API response status code: {response.status_code}")
-            logging.debug(f"API response content: {response.text}")
+            response = self._authorized_request(method, url, headers, 'api', params=params)
+            logger.debug("API response status code: %s, %d bytes", response.status_code, len(response.content))
 
             response.raise_for_status()
             if is_binary:
-                logging.debug("Received binary data.")
+                logger.debug("Received binary data.")
                 return response.content
             else:
-                response_json = response.json()
-                logging.debug(f"Received JSON response: {json.dumps(response_json, indent=2)}")
-                return response_json
+                return response.json()
         except requests.exceptions.RequestException as e:
-            logging.error(f"API request failed: {str(e)}")
-            logging.error(traceback.format_exc())
+            logger.error(f"API request failed: {str(e)}")
+            logger.error(traceback.format_exc())
             if 'response' in locals() and response is not None:
                 try:
-                    logging.error(f"Response content: {response.content.decode()}")
+                    logger.error(f"Response content: {response.content.decode()}")
                 except:
-                    logging.error("Failed to decode response content.")
+                    logger.error("Failed to decode response content.")
             raise
 
-    def get_new_issues(self):
-        logging.info("Fetching new issues from ODK API.")
-        try:
-            entities = self.fetch_entities()
-            processed_entities = self.process_entities(entities)
-            new_or_updated_issues = self.update_issues(processed_entities)
-            return new_or_updated_issues
-        except Exception as e:
-            logging.error(f"Failed to fetch new issues: {str(e)}")
-            logging.error(traceback.format_exc())
-            return []
+    def delta_params(self, feed, incremental=True):
+        # OData filter selecting only records created or changed since the last sync
+        cursor = get_sync_cursor(feed) if incremental else None
+        if not cursor:
+            logger.info(f"Fetching full {feed} feed.")
+            return None
+        logger.info(f"Fetching {feed} changes since {cursor}.")
+        clauses = [f"__system/{field} ge {cursor}" for field in SYNC_FEEDS[feed]]
+        return {'$filter': ' or '.join(clauses)}
+
+    def latest_timestamp(self, feed, page, latest=None):
+        # Newest __system timestamp in the page, or `latest` if that is newer
+        for record in page.get('value', []):
+            system = record.get('__system', {})
+            for field in SYNC_FEEDS[feed]:
+                value = system.get(field)
+                if value and (latest is None or value > latest):
+                    latest = value
+        return latest
+
+    def _iter_pages(self, endpoint, params=None, page_size=None, stage='fetch'):
+        # Yields one OData page at a time, following @odata.nextLink when the
+        # server sends one and falling back to $top/$skip otherwise
+        page_size = page_size or PAGE_SIZE
+        params = dict(params or {})
+        params['$top'] = page_size
+        skip = 0
+        while True:
+            with SYNC_STAGE_SECONDS.time(stage=stage):
+                page = self._make_request(endpoint, params=params)
+            records = page.get('value', [])
+            logger.debug("Fetched %d records from %s (skip %d).", len(records), endpoint, skip)
+            yield page
+
+            next_link = page.get('@odata.nextLink')
+            if next_link:
+                # The link carries its own query string
+                endpoint, params = next_link, None
+            elif len(records) >= page_size and params is not None:
+                skip += len(records)
+                params['$skip'] = skip
+            else:
+                return
 
-    def fetch_entities(self):
+    def fetch_entities(self, params=None):
         endpoint = 'v1/projects/2/datasets/problems.svc/Entities'
-        return self._make_request(endpoint)
+        return self._iter_pages(endpoint, params=params, stage='fetch_entities')
 
+    @SYNC_STAGE_SECONDS.timed(stage='process_entities')
     def process_entities(self, entities):
-        logging.info("Processing entities.")
+        logger.info("Processing entities.")
         processed_entities = {}
         for entity in entities.get('value', []):
             issue_id = entity.get('__id')
             if not issue_id:
-                logging.warning("Entity without __id encountered.")
+                logger.warning("Entity without __id encountered.", extra=SAMPLED)
                 continue
 
-            # Log raw entity data for debugging
-            logging.debug(f"Raw entity data: {json.dumps(entity, indent=2)}")
+            logger.debug("Raw entity data: %s", entity, extra=SAMPLED)
 
             processed_entities[issue_id] = {
                 'id': issue_id,
@@ -157,48 +280,32 @@ class ODKAPI:
                 except ValueError:
                     processed_entities[issue_id]['latitude'] = None
                     processed_entities[issue_id]['longitude'] = None
-                    logging.warning(f"Invalid geometry data in entity for issue {issue_id}: {geometry}")
+                    logger.warning("Invalid geometry data in entity for issue %s: %s", issue_id, geometry, extra=SAMPLED)
             else:
-                logging.warning(f"No geometry data found in entity for issue {issue_id}.")
+                logger.warning("No geometry data found in entity for issue %s.", issue_id, extra=SAMPLED)
         return processed_entities
 
+    @SYNC_STAGE_SECONDS.timed(stage='update_issues')
     def update_issues(self, processed_entities):
-        logging.info("Updating issues in the database.")
-        new_or_updated_issues = []
-        for issue_id, issue_data in processed_entities.items():
-            logging.debug(f"Processing issue ID: {issue_id}")
-            # Log the issue data before insertion
-            logging.debug(f"Issue data to insert/update: {json.dumps(issue_data, indent=2)}")
-            try:
-                insert_or_update_issue(issue_data)
-                new_or_updated_issues.append(issue_data)
-            except Exception as e:
-                logging.error(f"Error inserting/updating issue {issue_id}: {str(e)}")
-                logging.error(traceback.format_exc())
-        logging.info(f"Number of new or updated issues: {len(new_or_updated_issues)}")
+        logger.info("Updating issues in the database.")
+        # One transaction for the whole feed; unchanged versions are not rewritten
+        written_ids = set(upsert_issues(list(processed_entities.values())))
+        new_or_updated_issues = [issue_data for issue_id, issue_data in processed_entities.items() if issue_id in written_ids]
+        logger.info(f"Number of new or updated issues: {len(new_or_updated_issues)}")
         return new_or_updated_issues
 
-    def fetch_responses(self):
-        logging.info("Fetching responses from ODK API.")
-        try:
-            submissions = self.fetch_response_submissions()
-            processed_responses = self.process_responses(submissions)
-            self.save_responses(processed_responses)
-            logging.info(f"Fetched and stored {len(processed_responses)} new responses from ODK API.")
-        except Exception as e:
-            logging.error(f"Failed to fetch responses: {str(e)}")
-            logging.error(traceback.format_exc())
-
-    def fetch_response_submissions(self):
+    def fetch_response_submissions(self, params=None):
         endpoint = 'v1/projects/2/forms/address_problem.svc/Submissions'
-        return self._make_request(endpoint)
+        return self._iter_pages(endpoint, params=params, stage='fetch_response_submissions')
 
-    def process_responses(self, submissions):
-        logging.info("Processing responses from submissions.")
+    @SYNC_STAGE_SECONDS.timed(stage='process_responses')
+    def process_responses(self, submissions, downloads):
+        # downloads: {submission id: finished future of fetch_attachment()}
+        logger.info("Processing responses from submissions.")
         processed_responses = []
 
         for submission in submissions.get('value', []):
-            logging.debug(f"Processing submission: {json.dumps(submission, indent=2)}")
+            logger.debug("Processing submission: %s", submission, extra=SAMPLED)
 
             response_data = {}
             response_data['SubmissionDate'] = self._format_date(submission.get('__system', {}).get('submissionDate'))
@@ -206,10 +313,8 @@ class ODKAPI:
             response_data['SubmitterName'] = submission.get('__system', {}).get('submitterName')
 
             response_data['entity_problem'] = submission.get('entity', {}).get('problem')
-            logging.debug(f"Extracted entity_problem: {response_data['entity_problem']} for submission: {response_data['KEY']}")
 
             action = submission.get('action', {})
-            logging.debug(f"Action group for submission {response_data['KEY']}: {json.dumps(action, indent=2)}")
 
             response_data['action_role'] = action.get('role')
             response_data['action_status'] = action.get('status')
@@ -221,161 +326,188 @@ class ODKAPI:
             action_image_filename = action.get('image')
             if action_image_filename:
                 submission_id = submission.get('__id')
-                image_endpoint = f'v1/projects/2/forms/address_problem/submissions/{submission_id}/attachments/{action_image_filename}'
-                logging.debug(f"Constructed image endpoint: {image_endpoint} for submission {submission_id}")
                 try:
-                    action_image_data = self.download_image(image_endpoint)
+                    # None when the stored image is still current; the upsert keeps it
+                    action_image_data, etag = downloads[submission_id].result()
                     response_data['action_image'] = action_image_data
-                    logging.debug(f"Image downloaded successfully for submission {submission_id}.")
+                    if action_image_data is not None:
+                        response_data['attachment_name'] = action_image_filename
+                        response_data['attachment_etag'] = etag
+                        logger.debug("Image downloaded successfully for submission %s.", submission_id, extra=SAMPLED)
                 except Exception as e:
-                    logging.error(f"Failed to download action image for submission {submission_id}: {str(e)}")
-                    logging.error(traceback.format_exc())
+                    logger.error(f"Failed to download action image for submission {submission_id}: {str(e)}")
+                    logger.error(traceback.format_exc())
                     response_data['action_image'] = None
             else:
-                logging.info(f"No action image found for submission {submission.get('__id')}.")
+                logger.debug("No action image found for submission %s.", submission.get('__id'), extra=SAMPLED)
                 response_data['action_image'] = None
 
-            response_data_for_logging = {k: v for k, v in response_data.items() if k != 'action_image'}
-            logging.debug(f"Processed response data: {json.dumps(response_data_for_logging, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Processed response data: %s",
+                             {k: v for k, v in response_data.items() if k != 'action_image'}, extra=SAMPLED)
 
             processed_responses.append(response_data)
         return processed_responses
 
+    @SYNC_STAGE_SECONDS.timed(stage='save_responses')
     def save_responses(self, processed_responses):
-        logging.info("Saving responses to the database.")
+        logger.info("Saving responses to the database.")
+        # Resize before opening the write transaction so it stays short
+        # (SyncPipeline does it ahead of time, concurrently)
         for response in processed_responses:
-            try:
-                insert_response(response)
-                logging.info(f"Response with KEY {response.get('KEY')} saved successfully.")
-            except Exception as e:
-                logging.error(f"Failed to save response with KEY {response.get('KEY')}: {str(e)}")
-                logging.error(traceback.format_exc())
-                continue
-
-    def get_images(self):
-        logging.info("Fetching images from submissions.")
-        try:
-            submissions = self.fetch_image_submissions()
-            processed_images = self.process_images(submissions)
-            self.save_images(processed_images)
-            logging.info(f"Fetched and stored {len(processed_images)} new images from ODK API.")
-            return processed_images
-        except Exception as e:
-            logging.error(f"Failed to fetch images: {str(e)}")
-            logging.error(traceback.format_exc())
-            return []
-
-    def fetch_image_submissions(self):
+            if response.get('action_image') and 'variants' not in response:
+                response['variants'] = make_image_variants(response['action_image'])
+        written = upsert_responses(processed_responses)
+        logger.info(f"Saved {len(written)} of {len(processed_responses)} responses.")
+        # KEYs of the new or changed responses
+        return written
+
+    def fetch_image_submissions(self, params=None):
         endpoint = 'v1/projects/2/forms/report_problem.svc/Submissions'
-        return self._make_request(endpoint)
+        return self._iter_pages(endpoint, params=params, stage='fetch_image_submissions')
 
-    def process_images(self, submissions):
-        logging.info("Processing images from submissions.")
+    @SYNC_STAGE_SECONDS.timed(stage='process_images')
+    def process_images(self, submissions, downloads):
+        # downloads: {submission id: finished future of fetch_attachment()}
+        logger.info("Processing images from submissions.")
         processed_images = {}
         for submission in submissions.get('value', []):
-            logging.debug(f"Processing submission: {json.dumps(submission, indent=2)}")
+            logger.debug("Processing submission: %s", submission, extra=SAMPLED)
             problem_data = submission.get('problem', {})
             title = problem_data.get('problem_title', 'Untitled Image')
             image_filename = problem_data.get('problem_image')
 
             if image_filename:
                 submission_id = submission.get('__id')
-                image_endpoint = f'v1/projects/2/forms/report_problem/submissions/{submission_id}/attachments/{image_filename}'
-                logging.debug(f"Constructed image endpoint: {image_endpoint} for submission {submission_id}")
                 try:
-                    image_data = self.download_image(image_endpoint)
+                    image_data, etag = downloads[submission_id].result()
+                    if image_data is None:
+                        continue
                     processed_images[submission_id] = {
                         'submission_id': submission_id,
                         'title': title,
                         'label': problem_data.get('problem_label', None),
-                        'image_data': image_data
+                        'image_data': image_data,
+                        'attachment_name': image_filename,
+                        'attachment_etag': etag
                     }
-                    logging.debug(f"Processed image for submission {submission_id}: {image_filename}")
+                    logger.debug("Processed image for submission %s: %s", submission_id, image_filename, extra=SAMPLED)
                 except Exception as e:
-                    logging.error(f"Failed to download image for submission {submission_id}: {str(e)}")
-                    logging.error(traceback.format_exc())
+                    logger.error(f"Failed to download image for submission {submission_id}: {str(e)}")
+                    logger.error(traceback.format_exc())
             else:
-                logging.warning(f"No image data found in submission {submission.get('__id')}.")
+                logger.warning("No image data found in submission %s.", submission.get('__id'), extra=SAMPLED)
         return processed_images
 
+    @SYNC_STAGE_SECONDS.timed(stage='save_images')
     def save_images(self, processed_images):
-        logging.info("Saving images to the database.")
-        for submission_id, image_info in processed_images.items():
-            try:
-                insert_image(
-                    submission_id=image_info['submission_id'],
-                    title=image_info['title'],
-                    label=image_info.get('label', None),
-                    image_data=image_info['image_data']
-                )
-                logging.info(f"Image '{image_info['title']}' saved for submission {submission_id}.")
-            except Exception as e:
-                logging.error(f"Failed to save image for submission {submission_id}: {str(e)}")
-                logging.error(traceback.format_exc())
-
-    def download_image(self, image_endpoint):
-        headers = {
-            "Authorization": f"Bearer {self.session_token}",
-        }
+        logger.info("Saving images to the database.")
+        for image_info in processed_images.values():
+            if 'variants' not in image_info:
+                image_info['variants'] = make_image_variants(image_info['image_data'])
+        save_image_batch(list(processed_images.values()))
+        logger.info(f"Saved {len(processed_images)} images.")
+
+    def _attachment_endpoint(self, form, submission_id, filename):
+        return f'v1/projects/2/forms/{form}/submissions/{submission_id}/attachments/{filename}'
+
+    def fetch_attachment(self, form, submission, filename, stored=None):
+        """Download a submission attachment and return (data, etag).
+
+        `stored` is the {'name', 'etag'} already held for this submission, if
+        any; data is None when that copy is still current.
+        """
+        submission_id = submission.get('__id')
+        image_endpoint = self._attachment_endpoint(form, submission_id, filename)
+        if stored and stored['name'] == filename:
+            # Attachments only change when a submission is edited
+            if not submission.get('__system', {}).get('updatedAt'):
+                logger.debug("Attachment %s for submission %s already stored, skipping download.", filename, submission_id, extra=SAMPLED)
+                return None, stored['etag']
+            return self.download_attachment(image_endpoint, etag=stored['etag'])
+        return self.download_attachment(image_endpoint)
+
+    @SYNC_STAGE_SECONDS.timed(stage='download_image')
+    def download_attachment(self, image_endpoint, etag=None):
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
         if image_endpoint.startswith('http://') or image_endpoint.startswith('https://'):
             image_url = image_endpoint
         else:
             image_url = urljoin(self.base_url + '/', image_endpoint.lstrip('/'))
 
         try:
-            logging.debug(f"Downloading image from URL: {image_url}")
-            response = requests.get(image_url, headers=headers)
-            logging.debug(f"Image download response status code: {response.status_code}")
+            response = self._authorized_request('GET', image_url, headers, 'attachment')
+            logger.debug("Image download %s returned %s.", image_url, response.status_code, extra=SAMPLED)
+            if response.status_code == 304:
+                return None, etag
             response.raise_for_status()
-            logging.info("Image downloaded successfully.")
-            return response.content
+            return response.content, response.headers.get('ETag')
         except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to download image from {image_url}: {str(e)}")
-            logging.error(traceback.format_exc())
+            logger.error(f"Failed to download image from {image_url}: {str(e)}")
+            logger.error(traceback.format_exc())
             raise
 
-    def update_existing_issues_and_responses(self):
-        logging.info("Updating existing issues, images, and responses.")
+    @SYNC_STAGE_SECONDS.timed(stage='sync_total')
+    def update_existing_issues_and_responses(self, incremental=True):
+        logger.info("Updating existing issues, images, and responses.")
         try:
-            new_or_updated_issues = self.get_new_issues()
-            images = self.get_images()
-            self.fetch_responses()
-            logging.info(f"Updated issues: {len(new_or_updated_issues)}, Images: {len(images)}")
+            # The three feeds are fetched concurrently and written by a single writer
+            synced = asyncio.run(SyncPipeline(self, incremental=incremental).run())
+            new_or_updated_issues, images, responses = synced['issues'], synced['images'], synced['responses']
+            # Responses move issues between board columns and resolve them
+            with SYNC_STAGE_SECONDS.time(stage='refresh_issue_stats'):
+                refresh_issue_stats([issue['id'] for issue in new_or_updated_issues] + [response.get('entity_problem') for response in responses])
+            logger.info(f"Updated issues: {len(new_or_updated_issues)}, Images: {len(images)}, Responses: {len(responses)}")
             return {
                 'issues': new_or_updated_issues,
-                'images': images
+                'images': images,
+                'responses': responses
             }
         except Exception as e:
-            logging.error(f"Failed to update existing issues, images, and responses: {str(e)}")
-            logging.error(traceback.format_exc())
+            logger.error(f"Failed to update existing issues, images, and responses: {str(e)}")
+            logger.error(traceback.format_exc())
             return {}
 
     def _format_date(self, date_string):
         if not date_string:
-            logging.warning("Empty date string received.")
+            logger.warning("Empty date string received.", extra=SAMPLED)
             return "1970-01-01 00:00:00"
         try:
             dt = datetime.fromisoformat(date_string.rstrip('Z'))
             formatted_date = dt.strftime("%Y-%m-%d %H:%M:%S")
             return formatted_date
         except ValueError as e:
-            logging.error(f"Error formatting date '{date_string}': {str(e)}")
+            logger.error(f"Error formatting date '{date_string}': {str(e)}")
             return "1970-01-01 00:00:00"
 
+_client = None
+_client_lock = threading.Lock()
+
+def get_odk_client():
+    """Return the process-wide ODK client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ODKAPI()
+        return _client
+
 if __name__ == "__main__":
+    configure_logging()
     try:
         init_db()
-        logging.info("Database initialized successfully with 'issues', 'images', and 'responses' tables.")
+        logger.info("Database initialized successfully with 'issues', 'images', and 'responses' tables.")
     except Exception as e:
-        logging.error(f"Failed to initialize database: {str(e)}")
-        logging.error(traceback.format_exc())
+        logger.error(f"Failed to initialize database: {str(e)}")
+        logger.error(traceback.format_exc())
 
     try:
-        api = ODKAPI()
+        api = get_odk_client()
         result = api.update_existing_issues_and_responses()
-        logging.info(f"Updated {len(result.get('issues', []))} issues and {len(result.get('images', []))} images.")
+        logger.info(f"Updated {len(result.get('issues', []))} issues and {len(result.get('images', []))} images.")
     except Exception as e:
-        logging.error(f"Failed to update issues, images, and responses: {str(e)}")
-        logging.error(traceback.format_exc())
+        logger.error(f"Failed to update issues, images, and responses: {str(e)}")
+        logger.error(traceback.format_exc())
 
-    logging.info("Issues, images, and responses updating process completed.")
+    logger.info("Issues, images, and responses updating process completed.")
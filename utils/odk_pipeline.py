@@ -0,0 +1,197 @@
+"""Concurrent ODK sync: the three feeds run side by side on an asyncio loop.
+
+Each feed is a producer that pages through ODK, downloads the page's
+attachments and builds its image variants, then hands a write to a bounded
+queue. A single writer drains the queue, so database writes stay serialized
+while network and resize work overlap, and a full queue holds producers back
+until the writer catches up. Blocking calls (the pooled requests session,
+Pillow, SQLite) run on a worker thread via asyncio.to_thread.
+"""
+import asyncio
+import logging
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from functools import partial
+from database import get_stored_attachments, set_sync_cursor
+from utils.images import make_image_variants
+
+logger = logging.getLogger(__name__)
+
+# Pages processed but not yet written; bounds memory held by a slow writer
+WRITE_QUEUE_SIZE = int(os.getenv('ODK_WRITE_QUEUE_SIZE', '2'))
+# Image resizes in flight; CPU-bound, so no more than there are cores
+RESIZE_CONCURRENCY = os.cpu_count() or 2
+
+class SyncPipeline:
+    """One sync run for an ODKAPI client. Use `asyncio.run(SyncPipeline(api).run())`."""
+
+    def __init__(self, api, incremental=True, write_queue_size=WRITE_QUEUE_SIZE):
+        self.api = api
+        self.incremental = incremental
+        self.queue = asyncio.Queue(maxsize=max(1, write_queue_size))
+        self.results = {'problems': [], 'report_problem': [], 'address_problem': []}
+        # Feeds whose cursor must not advance because a fetch or write failed
+        self.failed = set()
+        # Attachment versions already stored, per owner type, and failed downloads per feed
+        self.stored_attachments = {}
+        self.download_failures = {'report_problem': 0, 'address_problem': 0}
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # Room for every download, resize and page fetch plus the writer; asyncio.run shuts it down
+        loop.set_default_executor(ThreadPoolExecutor(
+            max_workers=self.api.download_concurrency + RESIZE_CONCURRENCY + 4, thread_name_prefix='odk-sync'))
+        self._downloads = asyncio.Semaphore(self.api.download_concurrency)
+        self._resizes = asyncio.Semaphore(RESIZE_CONCURRENCY)
+
+        writer = asyncio.create_task(self._writer())
+        try:
+            await asyncio.gather(self._sync_issues(), self._sync_images(), self._sync_responses())
+        finally:
+            await self.queue.put(None)
+            await writer
+        return {
+            'issues': self.results['problems'],
+            'images': self.results['report_problem'],
+            'responses': self.results['address_problem'],
+        }
+
+    async def _writer(self):
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                return
+            feed, write = job
+            if feed in self.failed:
+                continue
+            try:
+                written = await asyncio.to_thread(write)
+                if written:
+                    self.results[feed].extend(written)
+            except Exception as e:
+                logger.error(f"Failed to write {feed} data: {str(e)}")
+                logger.error(traceback.format_exc())
+                self.failed.add(feed)
+
+    async def _write(self, feed, write):
+        # Blocks while the queue is full, which is what keeps producers in step with the writer
+        await self.queue.put((feed, write))
+
+    async def _pages(self, pages):
+        # Fetches the next page while the caller works on the current one
+        iterator = iter(pages)
+        upcoming = asyncio.ensure_future(asyncio.to_thread(next, iterator, None))
+        try:
+            while True:
+                page = await upcoming
+                if page is None:
+                    return
+                upcoming = asyncio.ensure_future(asyncio.to_thread(next, iterator, None))
+                yield page
+        finally:
+            if not upcoming.done():
+                upcoming.cancel()
+
+    async def _finish_feed(self, feed, latest):
+        # Queued behind the feed's pages, so the cursor only moves once they are written.
+        # Leave it in place after failed downloads so they are retried next sync.
+        if latest and not self.download_failures.get(feed) and feed not in self.failed:
+            await self._write(feed, partial(set_sync_cursor, feed, latest))
+
+    async def _download_attachments(self, owner_type, form, attachments):
+        # Returns {submission_id: finished task}; result() gives (data, etag) or raises
+        stored = self.stored_attachments[owner_type]
+
+        async def download(submission, filename):
+            async with self._downloads:
+                return await asyncio.to_thread(self.api.fetch_attachment, form, submission, filename,
+                                               stored.get(submission.get('__id')))
+
+        downloads = {
+            submission.get('__id'): asyncio.ensure_future(download(submission, filename))
+            for submission, filename in attachments if filename
+        }
+        if downloads:
+            await asyncio.wait(downloads.values())
+        # The client logs each failure; the cursor must not move past them
+        self.download_failures[form] += sum(1 for task in downloads.values() if task.exception() is not None)
+        return downloads
+
+    async def _add_variants(self, items, key):
+        # Resized here rather than in the writer so the write transaction stays short
+        async def add(item):
+            async with self._resizes:
+                item['variants'] = await asyncio.to_thread(make_image_variants, item[key])
+        await asyncio.gather(*(add(item) for item in items if item.get(key)))
+
+    async def _sync_issues(self):
+        feed = 'problems'
+        try:
+            latest = None
+            params = self.api.delta_params(feed, self.incremental)
+            async with aclosing(self._pages(self.api.fetch_entities(params=params))) as pages:
+                async for page in pages:
+                    await self._write(feed, partial(self.api.update_issues, self.api.process_entities(page)))
+                    latest = self.api.latest_timestamp(feed, page, latest)
+            await self._finish_feed(feed, latest)
+        except Exception as e:
+            logger.error(f"Failed to fetch new issues: {str(e)}")
+            logger.error(traceback.format_exc())
+            self.failed.add(feed)
+
+    async def _sync_images(self):
+        feed = 'report_problem'
+        try:
+            self.stored_attachments['issue'] = await asyncio.to_thread(get_stored_attachments, 'issue')
+            latest = None
+            params = self.api.delta_params(feed, self.incremental)
+            async with aclosing(self._pages(self.api.fetch_image_submissions(params=params))) as pages:
+                async for page in pages:
+                    downloads = await self._download_attachments('issue', feed, [
+                        (submission, submission.get('problem', {}).get('problem_image'))
+                        for submission in page.get('value', [])
+                    ])
+                    processed_images = self.api.process_images(page, downloads=downloads)
+                    await self._add_variants(processed_images.values(), 'image_data')
+                    await self._write(feed, partial(self._save_images, processed_images))
+                    latest = self.api.latest_timestamp(feed, page, latest)
+            await self._finish_feed(feed, latest)
+        except Exception as e:
+            logger.error(f"Failed to fetch images: {str(e)}")
+            logger.error(traceback.format_exc())
+            self.failed.add(feed)
+
+    def _save_images(self, processed_images):
+        self.api.save_images(processed_images)
+        # Submission ids of the stored images
+        return list(processed_images)
+
+    async def _sync_responses(self):
+        feed = 'address_problem'
+        try:
+            self.stored_attachments['response'] = await asyncio.to_thread(get_stored_attachments, 'response')
+            latest = None
+            params = self.api.delta_params(feed, self.incremental)
+            async with aclosing(self._pages(self.api.fetch_response_submissions(params=params))) as pages:
+                async for page in pages:
+                    downloads = await self._download_attachments('response', feed, [
+                        (submission, submission.get('action', {}).get('image'))
+                        for submission in page.get('value', [])
+                    ])
+                    processed_responses = self.api.process_responses(page, downloads=downloads)
+                    await self._add_variants(processed_responses, 'action_image')
+                    await self._write(feed, partial(self._save_responses, processed_responses))
+                    latest = self.api.latest_timestamp(feed, page, latest)
+            await self._finish_feed(feed, latest)
+        except Exception as e:
+            logger.error(f"Failed to fetch responses: {str(e)}")
+            logger.error(traceback.format_exc())
+            self.failed.add(feed)
+
+    def _save_responses(self, processed_responses):
+        written = set(self.api.save_responses(processed_responses))
+        # Only new or changed responses; keep just what callers need so image data is freed with the page
+        return [{'KEY': response.get('KEY'), 'entity_problem': response.get('entity_problem')}
+                for response in processed_responses if response.get('KEY') in written]
@@ -0,0 +1,36 @@
+import math
+
+# Clusters are computed on this many cells per tile side
+TILE_GRID = 4
+MAX_TILE_ZOOM = 22
+
+def tile_bounds(z, x, y):
+    """Return (west, south, east, north) in degrees for a Web Mercator (XYZ) tile."""
+    if not 0 <= z <= MAX_TILE_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {MAX_TILE_ZOOM}")
+    n = 2 ** z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError("tile coordinates out of range")
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+def locations_to_geojson(locations):
+    """Turn get_issue_locations() output into a GeoJSON FeatureCollection of points."""
+    features = []
+    for cluster in locations['clusters']:
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [cluster['lon'], cluster['lat']]},
+            'properties': {'cluster': True, 'count': cluster['count']},
+        })
+    for issue in locations['issues']:
+        features.append({
+            'type': 'Feature',
+            'id': issue['id'],
+            'geometry': {'type': 'Point', 'coordinates': [issue['lon'], issue['lat']]},
+            'properties': {'cluster': False, 'status': issue['status']},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,98 @@
+"""Sync worker: runs queued ODK syncs outside the web process.
+
+main.py starts this as a child process. Set SYNC_WORKER=external to run it
+separately with `python worker.py` instead.
+"""
+import os
+import time
+import logging
+import traceback
+from database import (
+    init_db,
+    claim_sync_job,
+    finish_sync_job,
+    fail_interrupted_sync_jobs,
+    save_metrics_snapshot,
+    prune_unreferenced_blobs
+)
+from utils.odk_api import get_odk_client
+from utils.log_config import configure_logging
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the job queue when it is empty
+POLL_INTERVAL = float(os.getenv('SYNC_POLL_INTERVAL', '2'))
+
+def run_sync_job(job):
+    # One client for the worker's lifetime, so its session token is reused across syncs
+    api = get_odk_client()
+    result = api.update_existing_issues_and_responses(incremental=not job['full_refresh'])
+    if not result:
+        raise RuntimeError("Sync failed, see the worker log for details")
+    # Only what the web process needs to invalidate caches and notify clients
+    return {
+        'issues': [{'id': issue['id'], 'version': issue.get('version')} for issue in result.get('issues', [])],
+        'images': list(result.get('images', [])),
+        'responses': result.get('responses', [])
+    }
+
+def prune_blobs():
+    # Part of the sync job, so replaced images are cleaned up as they go; a
+    # failure here doesn't fail the sync
+    try:
+        prune_unreferenced_blobs()
+    except Exception as e:
+        logger.error(f"Failed to prune image files: {str(e)}")
+        logger.error(traceback.format_exc())
+
+def publish_metrics():
+    # The web process serves these from /metrics with process="worker"
+    save_metrics_snapshot('worker', REGISTRY.snapshot())
+
+def run_worker(poll_interval=POLL_INTERVAL):
+    configure_logging()
+    init_db()
+    interrupted = fail_interrupted_sync_jobs()
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted sync job(s) as failed.")
+    logger.info("Sync worker started.")
+    publish_metrics()
+
+    # (job id, finish_sync_job arguments) whose outcome could not be saved yet
+    unsaved = None
+    while True:
+        try:
+            if unsaved:
+                finish_sync_job(unsaved[0], **unsaved[1])
+                unsaved = None
+
+            job = claim_sync_job()
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+
+            logger.info(f"Running sync job {job['id']} ({job['trigger']}, full refresh: {job['full_refresh']}).")
+            try:
+                result = run_sync_job(job)
+                outcome = {'result': result}
+                logger.info(f"Sync job {job['id']} finished. Updated issues: {len(result['issues'])}, "
+                            f"images: {len(result['images'])}, responses: {len(result['responses'])}")
+                prune_blobs()
+            except Exception as e:
+                logger.error(f"Sync job {job['id']} failed: {str(e)}")
+                logger.error(traceback.format_exc())
+                outcome = {'error': str(e)}
+            unsaved = (job['id'], outcome)
+            finish_sync_job(job['id'], **outcome)
+            unsaved = None
+            publish_metrics()
+        except Exception as e:
+            # e.g. "database is locked" past the busy timeout; a dead loop would leave
+            # jobs queued forever, so log and keep polling
+            logger.error(f"Sync worker error: {str(e)}")
+            logger.error(traceback.format_exc())
+            time.sleep(poll_interval)
+
+if __name__ == '__main__':
+    run_worker()